@@ -5,6 +5,9 @@
 """
 
 import os
+import shutil
+import tempfile
+import threading
 import time
 import logging
 
@@ -19,6 +22,7 @@ from PyQt4.QtCore import pyqtSignal
 from PyQt4.QtCore import QPoint
 from PyQt4.QtCore import QProcess
 from PyQt4.QtCore import QThread
+from PyQt4.QtCore import QTimer
 from PyQt4.QtGui import QIcon
 from PyQt4.QtGui import QMenu
 from PyQt4.QtGui import QWidget
@@ -41,6 +45,15 @@ import debugger_plugin.gui.providers
 
 import ndb3.rpc
 
+# Directory of the symbols cached between sessions.
+SYMBOLS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                 "ninja-debugger", "symbols")
+
+# Seconds to wait for the debugger to be ready for connections.
+READY_TIMEOUT = 5
+# Milliseconds between checks of the breakpoints of the editor.
+BREAKPOINTS_INTERVAL = 500
+
 
 class DebugPlugin(ninja_ide.core.plugin.Plugin):
     """
@@ -73,13 +86,26 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         # Debug attributes
         self.debugger_script = os.path.join(self.path, "ndb3", "ndb3.py")
         self.debugger_adapter = ndb3.rpc.RPCDebuggerAdapterClient()
+        self.events_adapter = None
+        self.monitor = None
+        self.ready_watcher = None
+        self._ready_dir = None
         
-        # Breakpoints
+        # Breakpoints, sent to the debugger as they change in the editor
         self._breakpoints = {}
+        self._breakpoints_timer = QTimer()
+        self._breakpoints_timer.setInterval(BREAKPOINTS_INTERVAL)
+        self._breakpoints_timer.timeout.connect(self.update_breakpoints)
+        
+        # Symbols of the files, indexed in the background
+        self.sym_finder = debugger_plugin.core.symbols.SymbolCache(
+                                                            SYMBOLS_CACHE_DIR)
+        self.sym_finder.start()
         
         # UI
         self._create_toolbar()
         self.threadsView = None
+        self.hover = None
         
         self.logger.info("Successfully initialized")
     
@@ -87,6 +113,7 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         """Shuts down the plugin and the debugger client."""
         # Stop debugger if it's running.
         self.debug_stop()
+        self.sym_finder.stop()
 
     #
     # Actions
@@ -100,9 +127,13 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         self.logger.info("Session start.")
         # Activate the UI elements (watches widget, threads, etc)
         self._activate_ui()
+        # The debugger creates this file once it's ready for connections.
+        self._ready_dir = tempfile.mkdtemp(prefix="ndb3-")
+        ready_file = os.path.join(self._ready_dir, "ready")
         try:
             # Add environment variable to be able to debug django projects
             os.environ['RUN_MAIN'] = 'true'
+            os.environ[ndb3.rpc.READY_FILE_ENV] = ready_file
             # Set execution options for this session.
             exec_opts = ninja_ide.core.settings.EXECUTION_OPTIONS
             ninja_ide.core.settings.EXECUTION_OPTIONS = "{0}".format(self.debugger_script)
@@ -111,42 +142,91 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
             # Run project
             fn_run()
             self._activate_debug_actions(True)
-            # Wait for the debugger to start
-            time.sleep(1)
-            if self.debugger_adapter.connect(retries=3):
-                # Clear ALL breakpoints before setting new ones.
-                self.debugger_adapter.clear_breakpoints('')
-                
-                # Set all breakpoints currently in the editor
-                for b, ls in ninja_ide.core.settings.BREAKPOINTS.items():
-                    for l in ls:
-                        # Add one to line number since the editor's line index
-                        # starts at zero(0), while the debugger's index starts
-                        # at one(1).
-                        self.logger.debug("Breakpoint {0}:{1}".format(b, l))
-                        self.debugger_adapter.set_breakpoint(b, l + 1)
-                
-                # Start event monitor
-                self.monitor = EventWatcher(self.debugger_adapter.get_messages)
-                self.monitor.newEvent.connect(self.process_event)
-                self.monitor.start()
-
-                # Start debugger
-                self.debugger_adapter.start()
-            else:
-                QMessageBox.information(self.editor.get_editor(),
-                     "Error when starting debugger",
-                     "The debugger could not be started")
-                self.debug_stop()
         finally:
             # Restore execution options
             ninja_ide.core.settings.EXECUTION_OPTIONS = exec_opts
+            os.environ.pop(ndb3.rpc.READY_FILE_ENV, None)
+        # Wait for the debugger to start off the GUI thread, the session
+        # goes on once it's ready.
+        self.ready_watcher = ReadyWatcher(ready_file, READY_TIMEOUT)
+        self.ready_watcher.ready.connect(self._debug_connect)
+        self.ready_watcher.start()
+
+    def _debug_connect(self, port):
+        """
+        Connect to the debugger listening on port and start the debugging
+        session. The port is None if the debugger didn't start.
+        """
+        self._remove_ready_dir()
+        if port is not None:
+            self.debugger_adapter.port = port
+        if port is not None and self.debugger_adapter.connect(retries=3):
+            # Replace ALL breakpoints with the ones currently in the
+            # editor, at once.
+            self._breakpoints = self._editor_breakpoints()
+            self.debugger_adapter.sync_breakpoints(self._breakpoints)
+            # Files with breakpoints are likely to be inspected
+            self.sym_finder.prefetch(self._breakpoints.keys())
+            # Breakpoints changed while the threads run must be hit too
+            self._breakpoints_timer.start()
+
+            # Start event monitor. It waits for messages on its own
+            # connection, so it doesn't hold the rest of the commands.
+            self.events_adapter = ndb3.rpc.RPCDebuggerAdapterClient(
+                                            self.debugger_adapter.host,
+                                            self.debugger_adapter.port)
+            self.events_adapter.connect()
+            self.monitor = EventWatcher(self.events_adapter.wait_messages)
+            self.monitor.newEvent.connect(self.process_event)
+            self.monitor.start()
+
+            # Start hover evaluator, symbols under the mouse are evaluated
+            # in the background.
+            self.hover = HoverEvaluator(self._evaluate_hover)
+            self.hover.newResult.connect(self.show_hover)
+            self.hover.start()
+
+            # Start debugger
+            self.debugger_adapter.start()
+        else:
+            QMessageBox.information(self.editor.get_editor(),
+                 "Error when starting debugger",
+                 "The debugger could not be started")
+            self.debug_stop()
         self.logger.info("Session ended.")
 
+    def _remove_ready_dir(self):
+        """Remove the directory of the ready file of the session."""
+        if self._ready_dir:
+            shutil.rmtree(self._ready_dir, ignore_errors=True)
+            self._ready_dir = None
+
+    def _editor_breakpoints(self):
+        """Return the breakpoints currently in the editor, by file."""
+        # Add one to line numbers since the editor's line index starts at
+        # zero(0), while the debugger's index starts at one(1).
+        return dict((f, sorted(l + 1 for l in ls))
+                    for f, ls in ninja_ide.core.settings.BREAKPOINTS.items())
+
     def update_breakpoints(self):
-        """Set the breakpoints currently active in the debugger."""
-        if not self.debugger_adapter.is_alive():
+        """
+        Set the breakpoints currently active in the debugger. Only the files
+        whose breakpoints changed since the last update are sent. Called
+        before every command and periodically while the session runs, so
+        it's cheap when nothing changed.
+        """
+        current = self._editor_breakpoints()
+        changed = [f for f in set(current) | set(self._breakpoints)
+                   if current.get(f, []) != self._breakpoints.get(f, [])]
+        if not changed or not self.debugger_adapter.is_alive():
             return
+        for filename in changed:
+            self.logger.debug("Breakpoints {0}: {1}".format(filename,
+                                                    current.get(filename, [])))
+            self.debugger_adapter.set_breakpoints(filename,
+                                                  current.get(filename, []))
+        self._breakpoints = current
+        self.sym_finder.prefetch(f for f in changed if f in current)
 
     def _move_editor_focus(self, file, line):
         """
@@ -204,7 +284,7 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
             stack = self.threads_model.get(tid).epointer
         if stack:
             self._move_editor_focus(stack.filename, stack.linenumber)
-            self.watchesWidget.view.update()
+            self.reevaluate_watches()
         else:
             self._move_editor_focus("<nofile>", -1)
     
@@ -257,6 +337,9 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         """Remove all the debugging ui elements from the editor."""
         # Remove mouse move handler
         self.__uninstall_mouse_handler()
+        if self.hover:
+            self.hover.stop()
+            self.hover = None
         # Restore active widget on explorer container
         self.explorer._explorer.setCurrentWidget(self._old_active_widget_widget)
         # Remove threads container
@@ -341,7 +424,6 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         after the custom handler is done.
         """
         editor_widget = self.editor.get_editor()
-        self.sym_finder = dict()
 
         # Save old mouse event
         self.__old_mouse_event = editor_widget.mouseMoveEvent
@@ -351,32 +433,33 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
             try:
                 # If no thread is selected, just ignore the move
                 thread_id = self.get_active_thread()
-                if not thread_id:
+                if not thread_id or self.hover is None:
                     return
                 
                 pos = event.pos()
                 c = editor_widget.cursorForPosition(pos)
                 
                 filepath = os.path.abspath(self.editor.get_editor_path())
-                if filepath not in self.sym_finder:
-                    finder = debugger_plugin.core.symbols.SymbolFinder(open(filepath).read())
-                    finder.parse()
-                    self.sym_finder[filepath] = finder
-                else:
-                    finder = self.sym_finder[filepath]
+                # Don't parse on the GUI thread, a file not indexed yet is
+                # indexed in the background.
+                finder = self.sym_finder.get(filepath, wait=False)
+                if finder is None:
+                    return
                 
                 sym = finder.get(c.blockNumber()+1, c.columnNumber())
-                if sym is not None:
-                    ret = self.debugger_adapter.evaluate(thread_id,
-                                                         sym.expression,
-                                                         depth=0)
-                    
-                    content = "{exp} = ({type}) {value}".format(
-                                    exp=sym.expression, type=ret['type'],
-                                    value=ret['value'])
-                    QToolTip.showText(editor_widget.mapToGlobal(pos), content)
-                
+                if sym is None:
+                    # Moved away, drop any pending evaluation
+                    self.hover.cancel()
+                    return
                 
+                # Show the value if it's known, evaluate it otherwise
+                global_pos = editor_widget.mapToGlobal(pos)
+                ret = self.hover.get(thread_id, sym.expression)
+                if ret is not None:
+                    self.hover.cancel()
+                    self._show_tooltip(global_pos, sym.expression, ret)
+                else:
+                    self.hover.request(thread_id, sym.expression, global_pos)
             finally:
                 self.__old_mouse_event(event)
         # Install new event handler
@@ -384,6 +467,26 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         
         print editor_widget.mouseMoveEvent
 
+    def _evaluate_hover(self, thread_id, expression):
+        """Evaluate the expression under the mouse cursor."""
+        return self.debugger_adapter.evaluate(thread_id, expression, depth=0)
+
+    def show_hover(self, result):
+        """
+        Executed when the HoverEvaluator has the value of the symbol under
+        the mouse cursor. Results of superseded requests are ignored.
+        """
+        if self.hover and self.hover.is_current(result['generation']):
+            self._show_tooltip(result['data'], result['expression'],
+                               result['value'])
+
+    def _show_tooltip(self, pos, expression, ret):
+        """Show the value of an expression in a tooltip at pos."""
+        content = "{exp} = ({type}) {value}".format(exp=expression,
+                                                    type=ret['type'],
+                                                    value=ret['value'])
+        QToolTip.showText(pos, content)
+
     def __uninstall_mouse_handler(self):
         """
         Removes the custom mouse event handler from the ninja-ide. Restores
@@ -400,6 +503,11 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         print repr(event)
         self.logger.debug("Processing event: ({0})".format(repr(event)))
 
+        # Values of the symbols may have changed
+        if self.hover and event['type'] in ('THREAD_PAUSE', 'THREAD_RESUME',
+                                            'EVENTS_DROPPED'):
+            self.hover.clear()
+
         if event['type'] == 'THREAD_CREATE':
             # New thread
             tid = event['id']
@@ -411,7 +519,14 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
             tid = event['id']
             tfile = event['file']
             tline = event['line']
+            # Index the files of the stack before the user hovers them, the
+            # stack is fetched by the workers of the cache.
+            self.sym_finder.prefetch([tfile])
+            self.sym_finder.prefetch_from(lambda: self._stack_files(tid))
             tobj = self.threads_model.get(tid)
+            if tobj is None:
+                # Its creation was dropped, wait for EVENTS_DROPPED
+                return
             tobj.state = debugger_plugin.core.models.ThreadModel.PAUSED
             st_trace = debugger_plugin.core.models.ThreadStackEntry(tfile, tline)
             tobj.epointer = st_trace
@@ -430,22 +545,82 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
             # Thread resumed
             tid = event['id']
             tobj = self.threads_model.get(tid)
+            if tobj is None:
+                # Its creation was dropped, wait for EVENTS_DROPPED
+                return
             tobj.state = debugger_plugin.core.models.ThreadModel.RUNNING
             self.threadsView.update(tobj, True)
         
+        if event['type'] == 'LOG':
+            # New messages from log points
+            self.fetch_logs()
+
+        if event['type'] == 'EVENTS_DROPPED':
+            # Some events were lost, fetch the state of the threads and the
+            # logs again
+            self.logger.warning("{0} events were dropped.".format(
+                                                            event['count']))
+            self.resync_threads()
+            self.fetch_logs()
+
         #if event['type'] == 'DEBUG_START':
         #    pass
         
         if event['type'] == 'DEBUG_END':
             self.debugger_adapter.stop()
-            # Wait half second before kill the process
-            time.sleep(0.5)
             self.debug_stop()
     
+    def _stack_files(self, thread_id):
+        """Return the set of files in the stack of the thread."""
+        stack = self.debugger_adapter.get_stack_frames(thread_id,
+                                                       include_ids=False)
+        if not stack:
+            return set()
+        return set(f['file'] for f in stack['frames'])
+
+    def fetch_logs(self):
+        """Get all the messages of the log points at once and show them."""
+        logs = self.debugger_adapter.get_logs()
+        if not logs:
+            return
+        if logs['dropped']:
+            self.logger.warning("{0} log entries were dropped.".format(
+                                                            logs['dropped']))
+        for entry in logs['entries']:
+            self.logger.info("{0}:{1}: {2}".format(entry['file'],
+                                                   entry['line'],
+                                                   entry['message']))
+
     #
     # Threads management
     #
     
+    def resync_threads(self):
+        """Update the threads model with the threads of the debugger."""
+        models = debugger_plugin.core.models
+        alive = set()
+        for tid, name, state in self.debugger_adapter.list_threads():
+            alive.add(tid)
+            tobj = self.threads_model.get(tid)
+            if tobj is None:
+                tobj = models.ThreadModel(tid, name, models.ThreadModel.RUNNING)
+                self.threads_model.add(tid, tobj)
+            if state == 'paused':
+                tobj.state = models.ThreadModel.PAUSED
+                # Its THREAD_PAUSE may have been dropped, get its position
+                stack = self.debugger_adapter.get_stack_frames(tid, 0, 1,
+                                                        include_ids=False)
+                if stack and stack['frames']:
+                    frame = stack['frames'][0]
+                    tobj.epointer = models.ThreadStackEntry(frame['file'],
+                                                            frame['line'])
+            else:
+                tobj.state = models.ThreadModel.RUNNING
+        for tobj in list(self.threads_model):
+            if tobj.ident not in alive:
+                self.threads_model.remove(tobj.ident)
+        self.threadsView.update(expand=True)
+
     def get_active_thread(self):
         """
         Return the currently selected thread in threadview.
@@ -468,6 +643,7 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         # Check if we have selected a thread in the ThreadsView and
         # resume only that thread.
         thread_id = self.get_active_thread()
+        self.update_breakpoints()
         
         # Resume just the selected thread. If thread_id is None, then all
         # threads are resumed.
@@ -478,14 +654,31 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
 
     def debug_stop(self):
         """Stops the debugger and ends the debugging session."""
+        # Stop waiting for the debugger if it's still starting
+        if self.ready_watcher:
+            self.ready_watcher.cancel()
+            self.ready_watcher.wait()
+            self.ready_watcher = None
+        self._remove_ready_dir()
+        self._breakpoints_timer.stop()
         self.ide.actions.kill_execution()
         self._activate_debug_actions(False)
         self._deactivate_ui()
+        # Closing the connection of the events interrupts the wait of the
+        # monitor.
+        if self.monitor:
+            self.monitor.quit()
+            self.monitor = None
+        if self.events_adapter:
+            self.events_adapter.disconnect()
+            self.events_adapter = None
+        self.debugger_adapter.disconnect()
 
     def debug_over(self):
         """Sends a command to the debugger to execute a step over."""
         thread_id = self.get_active_thread()
         if thread_id:
+            self.update_breakpoints()
             # Step just the selected thread
             self.debugger_adapter.step_over(thread_id)
 
@@ -493,6 +686,7 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         """Sends a command to the debugger to execute a step into."""
         thread_id = self.get_active_thread()
         if thread_id:
+            self.update_breakpoints()
             # Step just the selected thread
             self.debugger_adapter.step_into(thread_id)
 
@@ -500,6 +694,7 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
         """Sends a command to the debugger to execute a step out."""
         thread_id = self.get_active_thread()
         if thread_id:
+            self.update_breakpoints()
             # Step just the selected thread
             self.debugger_adapter.step_out(thread_id)
     
@@ -515,20 +710,46 @@ class DebugPlugin(ninja_ide.core.plugin.Plugin):
             watch.type = ret['type']
             watch.value = ret['value']
 
+    def reevaluate_watches(self):
+        """
+        Evaluate all the watches in the context of the selected thread with a
+        single call to the debugger.
+        """
+        thread_id = self.get_active_thread()
+        watches = self.watchesWidget.get_model()
+        if thread_id and watches:
+            exprs = [w.expression for w in watches]
+            results = self.debugger_adapter.evaluate_many(thread_id, exprs,
+                                                          depth=0)
+            for watch, ret in zip(watches, results):
+                watch.type = ret['type']
+                watch.value = ret['value']
+        # Updating the items emits itemChanged, which would evaluate each
+        # watch again on its own
+        view = self.watchesWidget.view
+        try:
+            view.blockSignals(True)
+            view.update()
+        finally:
+            view.blockSignals(False)
+
 
 class EventWatcher(QThread):
     """
     An object of this class allows to monitor a DebuggerSlave. The object will
-    poll continuously for events thru the DebuggerMaster. If an event appears a
+    wait continuously for events thru the DebuggerMaster. If an event appears a
     signal will be triggered.
     """
     newEvent = pyqtSignal(dict, name="newEvent(PyQt_PyObject)")
 
-    def __init__(self, get_messages_fn):
+    # Seconds that each wait for events lasts on the debugger side.
+    WAIT_TIMEOUT = 30
+
+    def __init__(self, wait_messages_fn):
         """Initializes the EventWatcher."""
         QThread.__init__(self)
         self.__state = "stopped"
-        self.fn = get_messages_fn
+        self.fn = wait_messages_fn
         self.logger = logging.getLogger(__name__)
 
     def run(self):
@@ -539,19 +760,172 @@ class EventWatcher(QThread):
         try:
             self.logger.info("Starting event watcher")
             self.__state = "running"
+            since_seq = 0
             while self.__state == "running":
                 # If the next call raises an exception, do I really want to go on?
-                events = self.fn()
+                events = self.fn(self.WAIT_TIMEOUT, since_seq)
                 for e in events:
                     self.logger.debug("New Event: {0}".format(repr(e)))
+                    since_seq = e['seq']
                     self.newEvent.emit(e)
-                time.sleep(0.1)
         except:
             pass
         # Done with the loop
         self.__state = "stopped"
 
     def quit(self):
-        """Ends the cycle of polling the debugger for events."""
+        """Ends the cycle of waiting the debugger for events."""
         self.logger.info("Stopping event watcher")
         self.__state = "stopping"
+
+
+class ReadyWatcher(QThread):
+    """
+    An object of this class waits for the debugger to create its ready file
+    off the GUI thread. Once it's created, or after timeout seconds, the ready
+    signal is emitted with the port of the debugger (None if it didn't
+    start). The signal is not emitted if the wait is cancelled.
+    """
+    ready = pyqtSignal(object, name="ready(PyQt_PyObject)")
+
+    def __init__(self, path, timeout):
+        """Initializes the ReadyWatcher."""
+        QThread.__init__(self)
+        self.path = path
+        self.timeout = timeout
+        self._stop = threading.Event()
+
+    def run(self):
+        """Wait for the ready file and emit the ready signal."""
+        port = ndb3.rpc.wait_ready_file(self.path, self.timeout,
+                                        stop=self._stop)
+        if not self._stop.is_set():
+            self.ready.emit(port)
+
+    def cancel(self):
+        """Stop waiting for the ready file."""
+        self._stop.set()
+
+
+class HoverEvaluator(QThread):
+    """
+    An object of this class evaluates the symbols under the mouse cursor off
+    the GUI thread. Requests are debounced: only the last request made is
+    evaluated, once no other one arrives for DEBOUNCE seconds. Every time a
+    result is ready, the newResult signal is emitted.
+
+    Results are cached by thread and expression until clear is called, that
+    is, until the state of the threads changes.
+    """
+    newResult = pyqtSignal(dict, name="newResult(PyQt_PyObject)")
+
+    # Seconds without new requests before evaluating the last one.
+    DEBOUNCE = 0.15
+
+    def __init__(self, evaluate_fn):
+        """
+        Initializes the HoverEvaluator.
+
+        def evaluate_fn(thread_id, expression)
+        """
+        QThread.__init__(self)
+        self.fn = evaluate_fn
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._running = True
+        # Last request (thread id, expression, data) and when to evaluate it
+        self._request = None
+        self._deadline = 0
+        # Incremented by every request or cancel, results of older requests
+        # are superseded.
+        self._generation = 0
+        # Incremented by every clear, results of evaluations started before
+        # are not cached.
+        self._epoch = 0
+        self._cache = {}
+
+    def get(self, thread_id, expression):
+        """Return the cached value of expression, None if it's unknown."""
+        with self._cond:
+            return self._cache.get((thread_id, expression))
+
+    def request(self, thread_id, expression, data = None):
+        """
+        Request the evaluation of expression in the thread, superseding any
+        previous request. The data is returned along with the result.
+        """
+        with self._cond:
+            self._generation += 1
+            self._request = (thread_id, expression, data)
+            self._deadline = time.time() + self.DEBOUNCE
+            self._cond.notify_all()
+        return self._generation
+
+    def cancel(self):
+        """Supersede any pending request."""
+        with self._cond:
+            self._generation += 1
+            self._request = None
+
+    def is_current(self, generation):
+        """Return True if the request with generation wasn't superseded."""
+        return generation == self._generation
+
+    def clear(self):
+        """Drop the cached results."""
+        with self._cond:
+            self._epoch += 1
+            self._cache = {}
+
+    def stop(self):
+        """Stop evaluating requests."""
+        with self._cond:
+            self._running = False
+            self._request = None
+            self._cond.notify_all()
+
+    def _next_request(self):
+        """
+        Wait for a request to be due and return it with its generation and
+        the epoch of the cache. Return None if stopped.
+        """
+        with self._cond:
+            while self._running:
+                if self._request is None:
+                    self._cond.wait()
+                    continue
+                timeout = self._deadline - time.time()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+                request = self._request
+                self._request = None
+                return request, self._generation, self._epoch
+        return None
+
+    def run(self):
+        """
+        Evaluates the requests until stopped. Results of superseded requests
+        are cached but not emitted.
+        """
+        while True:
+            next_request = self._next_request()
+            if next_request is None:
+                break
+            (thread_id, expression, data), generation, epoch = next_request
+            try:
+                value = self.fn(thread_id, expression)
+            except Exception as err:
+                self.logger.debug("Hover evaluation failed: {0}".format(err))
+                continue
+            if value is None:
+                continue
+            with self._cond:
+                if epoch == self._epoch:
+                    self._cache[(thread_id, expression)] = value
+                if generation != self._generation:
+                    continue
+            self.newResult.emit({'generation': generation,
+                                 'expression': expression,
+                                 'value': value,
+                                 'data': data})
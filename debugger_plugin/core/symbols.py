@@ -4,7 +4,19 @@
     Module to handle symbols.
 """
 import ast
+import bisect
+import copy
+import cPickle
+import hashlib
+import os
+import Queue
+import re
 import sys
+import tempfile
+import threading
+
+# Version of the symbols cached on disk, change it when SymbolFinder does.
+_CACHE_VERSION = 1
 
 
 class SymbolFinder(ast.NodeVisitor):
@@ -19,12 +31,99 @@ class SymbolFinder(ast.NodeVisitor):
         """
         self.symbols = dict()
         self.source = source
+        # Lines of the source, and the first line of each top-level block
+        # (statement of the module), to reparse only the blocks that change.
+        self._lines = None
+        self._blocks = None
+        # Intervals of the symbols by line, built on demand (see get).
+        self._index = dict()
+
+    def __getstate__(self):
+        """Return the state to pickle, the index is built again on demand."""
+        state = self.__dict__.copy()
+        state['_index'] = dict()
+        return state
 
     def parse(self):
         """ """
         module = ast.parse(self.source)
+        self.symbols = dict()
+        self._index = dict()
+        self._lines = self.source.splitlines()
+        self.visit(module)
+        self._blocks = _block_starts(module, 1)
+
+    def update(self, source):
+        """
+        Update the symbols for the new source. Only the top-level blocks that
+        changed are parsed again, unless the change cannot be isolated. Raise
+        SyntaxError if the source cannot be parsed, the symbols are left
+        untouched then.
+        """
+        if self._blocks is None:
+            finder = SymbolFinder(source)
+            finder.parse()
+            self.__dict__.update(finder.__dict__)
+            return
+
+        old, new = self._lines, source.splitlines()
+        # Lines in common at the beginning and at the end
+        size = min(len(old), len(new))
+        first = 0
+        while first < size and old[first] == new[first]:
+            first += 1
+        last = 0
+        while last < size - first and old[-1 - last] == new[-1 - last]:
+            last += 1
+        if first == len(old) == len(new):
+            self.source = source
+            return
+
+        # Blocks with changes, from the block of the first changed line to
+        # the block of the last one (in lines of the old source).
+        first_line = min(first, len(old) - 1) + 1
+        last_line = max(first_line, len(old) - last)
+        bfirst = max(bisect.bisect_right(self._blocks, first_line) - 1, 0)
+        blast = max(bisect.bisect_right(self._blocks, last_line) - 1, 0)
+        start = self._blocks[bfirst]
+        if blast + 1 < len(self._blocks):
+            end = self._blocks[blast + 1]
+        else:
+            end = len(old) + 1
+        delta = len(new) - len(old)
+
+        try:
+            module = ast.parse("\n".join(new[start - 1:end - 1 + delta]))
+        except SyntaxError:
+            # The change affects other blocks (e.g. an unclosed string)
+            finder = SymbolFinder(source)
+            finder.parse()
+            self.__dict__.update(finder.__dict__)
+            return
+        ast.increment_lineno(module, start - 1)
+
+        # Drop the symbols of the changed blocks and move the next ones. The
+        # nodes may be shared with copies of this finder (see SymbolCache),
+        # so moved nodes are new ones.
+        symbols = dict()
+        for line, nodes in self.symbols.iteritems():
+            if line >= end:
+                if delta:
+                    nodes = [SymbolNode(node.expression, node.line + delta,
+                                        node.column) for node in nodes]
+                symbols[line + delta] = nodes
+            elif line < start:
+                symbols[line] = nodes
+        self.symbols = symbols
+        self._index = dict()
+        self._lines = new
         self.visit(module)
 
+        self._blocks = (self._blocks[:bfirst] +
+                        _block_starts(module, start) +
+                        [line + delta for line in self._blocks[blast + 1:]])
+        self.source = source
+
     def __add_node(self, node):
         """
         Callback method executed by the ProcessorNodeVisitor when a symbol
@@ -41,73 +140,321 @@ class SymbolFinder(ast.NodeVisitor):
         If two symbols overlap, e.g. "os.path" is both "os" and "os.path", in
         this case, will return os, since os.path is bigger.
         """
-        if line not in self.symbols:
-            return None
+        try:
+            starts, ends, nodes, parents = self._index[line]
+        except KeyError:
+            if line not in self.symbols:
+                return None
+            starts, ends, nodes, parents = _line_index(self.symbols[line])
+            self._index[line] = (starts, ends, nodes, parents)
+
+        # The last symbol that starts before column is the smallest one, if
+        # it doesn't contain column, look in the symbols that contain it.
+        i = bisect.bisect_right(starts, column) - 1
+        while i >= 0:
+            if column < ends[i]:
+                return nodes[i]
+            i = parents[i]
+        return None
+
+    def visit_Name(self, node):
+        """Add the symbol of a name."""
+        self.__add_node(SymbolNode(node.id, node.lineno, node.col_offset))
+
+    def visit_Attribute(self, node):
+        """Add the symbols of an attribute (see _visit_dotted)."""
+        self._visit_dotted(node)
+
+    def _visit_dotted(self, node):
+        """
+        Add the symbols of a dotted name, e.g. "os", "os.path" and
+        "os.path.join" for os.path.join, and return its expression. Each
+        expression is built from the one of its value, bottom-up. Return
+        None if the node is not a dotted name (e.g. the attribute of a call),
+        its children are visited as usual then.
+        """
+        if isinstance(node, ast.Name):
+            self.visit_Name(node)
+            return node.id
+        if isinstance(node, ast.Attribute):
+            value = self._visit_dotted(node.value)
+            if value is None:
+                return None
+            expression = value + "." + node.attr
+            self.__add_node(SymbolNode(expression, node.lineno,
+                                       node.col_offset))
+            return expression
+        self.visit(node)
+        return None
+
+    def visit_ClassDef(self, node):
+        """Add the symbol of the class name."""
+        self._visit_definition(node, "class")
+
+    def visit_FunctionDef(self, node):
+        """Add the symbol of the function name."""
+        self._visit_definition(node, "def")
+
+    def _visit_definition(self, node, keyword):
+        """
+        Add the symbol of the name of a class or function definition and
+        visit its children.
+        """
+        line = node.lineno
+        column = node.col_offset + len(keyword) + 1
+        if node.decorator_list:
+            # Decorated definitions are positioned at their first decorator,
+            # look for the name after the last one.
+            pattern = re.compile(r"\s*{0}\s+({1})\b".format(keyword, node.name))
+            for i in xrange(node.decorator_list[-1].lineno, len(self._lines)):
+                match = pattern.match(self._lines[i])
+                if match:
+                    line, column = i + 1, match.start(1)
+                    break
+        self.__add_node(SymbolNode(node.name, line, column))
+        self.generic_visit(node)
+
 
-        slen = sys.maxint
-        sym = None
-        for s in self.symbols[line]:
-            if column >= s.column and column < (s.column + s.size) and s.size < slen:
-                sym = s
-        return sym
-
-    def generic_visit(self, node):
-        """Method overwritted from the NodeVisitor class."""
-        if type(node) in [ast.Name, ast.ClassDef, ast.FunctionDef, ast.Attribute]:
-            # Add node offset for special cases
-            if isinstance(node, ast.ClassDef):
-                node.col_offset += len("class ")
-            if isinstance(node, ast.FunctionDef):
-                node.col_offset += len("def ")
-
-            self.__add_node(SymbolNode(node=node,
-                                       line=node.lineno,
-                                       column=node.col_offset))
-        ast.NodeVisitor.generic_visit(self, node)
-
-
-class SymbolNode:
+class SymbolCache(object):
     """
-    This class represents an object symbol. A symbol is a variable or attribute
-    of a class. Given a source file, a symbol is located at a certain line
-    and column.
+    Cache of the SymbolFinders of the files, by path. A finder is updated
+    when its file changes: the modification time is checked on every lookup,
+    and the contents are parsed again only if their hash changed.
+
+    With a cache_dir, finders are also saved there, by hash of the contents,
+    so the files already parsed in other sessions are only loaded. Files can
+    be indexed in the background with prefetch, once the workers are started.
+
+    Lookups are thread safe. Finders are never modified once returned, so
+    they can be used while the file is being parsed again.
     """
 
-    def __init__(self, expr=None, node=None, line=0, column=0):
+    def __init__(self, cache_dir = None, cache_limit = 512):
         """
-        Initializes a SymbolNode. The SymbolNode can be created either by
-        specifying the expression (str) or by passing the node with the ast.
+        Initializes an empty SymbolCache. At most cache_limit finders are
+        kept in cache_dir, the least recently written are removed.
         """
-        self.expression = expr or self._calculate_expression(node)
-        self.size = len(self.expression)
-        self.line = line
-        self.column = column
+        self.cache_dir = cache_dir
+        self.cache_limit = cache_limit
+        # Modification time, hash of the contents and finder, by path.
+        self._finders = dict()
+        self._lock = threading.Lock()
+        # Locks to parse each file once at a time, by path.
+        self._path_locks = dict()
+        # Paths to index in the background, and the workers doing it.
+        self._queue = Queue.Queue()
+        self._workers = []
+        # Paths queued by the lookups that don't wait, queued once.
+        self._queued = set()
 
-    def _calculate_expression(self, node):
-        """Return the textual representation of a node."""
-        sep = ""
-        if not node:
-            return ""
+    def get(self, path, wait = True):
+        """
+        Return the SymbolFinder of the file at path, None if the file was
+        never parsed successfully. If the file cannot be parsed anymore, the
+        symbols of its last successful parse are kept.
 
-        if isinstance(node, ast.FunctionDef) or isinstance(node, ast.ClassDef):
-            return node.name
+        If wait is False, never parse the file: return the last finder of the
+        file (or None) at once and index the file in the background.
+        """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            mtime_old, _, finder = self._finders.get(path, (None, None, None))
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+            if mtime != mtime_old and not wait and path not in self._queued:
+                self._queued.add(path)
+                self._queue.put(path)
+        if mtime == mtime_old or not wait:
+            return finder
 
-        if isinstance(node, ast.Attribute):
-            sep = "."
-
-        res = str(node)
-        if hasattr(node, '_fields'):
-            res = []
-            for i in node._fields:
-                rn = self._calculate_expression(getattr(node, i))
-                if rn:
-                    if i == 's':
-                        rn = '"' + rn + '"'
-                    if i == "func":
-                        rn = rn + "()"
-                    res.append(rn)
-            res = sep.join(res)
-        return res
+        with path_lock:
+            # It may have been parsed while waiting
+            mtime_old, digest_old, finder = self._finders.get(path,
+                                                              (None, None, None))
+            if mtime == mtime_old:
+                return finder
+            with open(path) as fd:
+                source = fd.read()
+            digest = hashlib.sha1(source).hexdigest()
+            if digest != digest_old:
+                try:
+                    finder = self._parse(source, digest, finder)
+                except SyntaxError:
+                    pass
+            with self._lock:
+                self._finders[path] = (mtime, digest, finder)
+        return finder
+
+    def _parse(self, source, digest, finder):
+        """
+        Return a SymbolFinder for source (whose hash is digest), loaded from
+        cache_dir, updated from the previous finder of the file (if any) or
+        parsed. Raise SyntaxError if source cannot be parsed.
+        """
+        new_finder = self._load(digest)
+        if new_finder is not None:
+            return new_finder
+        if finder is None:
+            new_finder = SymbolFinder(source)
+            new_finder.parse()
+        else:
+            # Update a copy, the finder may be in use
+            new_finder = copy.copy(finder)
+            new_finder.update(source)
+        self._save(digest, new_finder)
+        return new_finder
+
+    def _cache_path(self, digest):
+        """Return the path of the file of digest in cache_dir."""
+        return os.path.join(self.cache_dir,
+                            "symbols-{0}-{1}".format(_CACHE_VERSION, digest))
+
+    def _load(self, digest):
+        """Return the SymbolFinder saved for digest, None if there is none."""
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(digest), "rb") as fd:
+                return cPickle.load(fd)
+        except Exception:
+            # Missing, truncated or invalid file, it will be replaced
+            return None
+
+    def _save(self, digest, finder):
+        """
+        Save the finder for digest in cache_dir. The file is written at once,
+        so other sessions never read it partially written.
+        """
+        if not self.cache_dir:
+            return
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as tmp_file:
+                cPickle.dump(finder, tmp_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._cache_path(digest))
+            self._prune()
+        except (IOError, OSError):
+            # The cache is optional
+            pass
+
+    def _prune(self):
+        """Remove the oldest files in cache_dir beyond cache_limit."""
+        paths = [os.path.join(self.cache_dir, name)
+                 for name in os.listdir(self.cache_dir)]
+        if len(paths) <= self.cache_limit:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.cache_limit]:
+            os.remove(path)
+
+    def prefetch(self, paths):
+        """Index the files at paths in the background (see start)."""
+        for path in paths:
+            self._queue.put(path)
+
+    def prefetch_from(self, paths_fn):
+        """
+        Index the files at the paths returned by paths_fn, which is called in
+        the background too (e.g. when getting the paths is slow).
+        """
+        self._queue.put(paths_fn)
+
+    def start(self, workers = 2):
+        """Start the workers that index the files requested by prefetch."""
+        for i in xrange(workers):
+            worker = threading.Thread(target=self._work,
+                                      name="SymbolCache-{0}".format(i))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """Stop the workers once the files already requested are indexed."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def _work(self):
+        """Index the paths in the queue until a None is found."""
+        while True:
+            path = self._queue.get()
+            if path is None:
+                break
+            if callable(path):
+                try:
+                    paths = path()
+                except Exception:
+                    # Indexing in advance is optional
+                    continue
+            else:
+                with self._lock:
+                    self._queued.discard(path)
+                paths = [path]
+            for path in paths:
+                try:
+                    self.get(path)
+                except (IOError, OSError):
+                    # Not a file (e.g. "<string>") or it was removed
+                    pass
+
+
+def _block_starts(module, start):
+    """
+    Return the first line of each top-level block (statement) of the module.
+    The first block starts at line start, so it includes the lines before
+    the first statement.
+    """
+    lines = [start]
+    for stmt in module.body:
+        # Statements that begin with a multi-line string (e.g. docstrings)
+        # have the position of the end of the string, keep them in the
+        # previous block.
+        if stmt.col_offset < 0:
+            continue
+        line = min([stmt.lineno] +
+                   [d.lineno for d in getattr(stmt, 'decorator_list', [])])
+        if line > lines[-1]:
+            lines.append(line)
+    return lines
+
+
+def _line_index(symbols):
+    """
+    Return the index of the symbols of a line: their start and end columns,
+    the symbols and, for each symbol, the position of the nearest one that
+    contains it (-1 for none). Symbols are sorted by start column, the
+    biggest first.
+    """
+    nodes = sorted(symbols, key=lambda s: (s.column, -s.size))
+    starts = [s.column for s in nodes]
+    ends = [s.column + s.size for s in nodes]
+    parents = []
+    stack = []
+    for i in xrange(len(nodes)):
+        while stack and ends[stack[-1]] < ends[i]:
+            stack.pop()
+        parents.append(stack[-1] if stack else -1)
+        stack.append(i)
+    return starts, ends, nodes, parents
+
+
+class SymbolNode(object):
+    """
+    This class represents an object symbol. A symbol is a variable or attribute
+    of a class. Given a source file, a symbol is located at a certain line
+    and column, and spans the size of its expression.
+    """
+    __slots__ = ('expression', 'size', 'line', 'column')
+
+    def __init__(self, expr, line=0, column=0):
+        """Initializes a SymbolNode for the expression (str)."""
+        self.expression = expr
+        self.size = len(expr)
+        self.line = line
+        self.column = column
 
     def __repr__(self):
         """
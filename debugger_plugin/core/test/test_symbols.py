@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" """
+import os
+import shutil
+import tempfile
+import unittest
+
+import debugger_plugin.core.symbols
+
+SOURCE = """import os
+
+def first(a):
+    return os.path.join(a)
+
+@decorator
+def second(b):
+    return b.c
+"""
+
+
+class TestSymbolFinder(unittest.TestCase):
+
+    def _parse(self, source):
+        finder = debugger_plugin.core.symbols.SymbolFinder(source)
+        finder.parse()
+        return finder
+
+    def test_get(self):
+        finder = self._parse(SOURCE)
+        self.assertEquals(finder.get(4, 11).expression, "os")
+        self.assertEquals(finder.get(4, 14).expression, "os.path")
+        self.assertEquals(finder.get(4, 3), None)
+        self.assertEquals(finder.get(2, 0), None)
+
+    def test_get_innermost(self):
+        finder = self._parse("a.b.c = f(x).y[i]\n")
+        self.assertEquals(finder.get(1, 0).expression, "a")
+        self.assertEquals(finder.get(1, 2).expression, "a.b")
+        self.assertEquals(finder.get(1, 4).expression, "a.b.c")
+        # Attributes of calls are not symbols
+        self.assertEquals(finder.get(1, 10).expression, "x")
+        self.assertEquals(finder.get(1, 13), None)
+        self.assertEquals(finder.get(1, 15).expression, "i")
+
+    def test_get_definitions(self):
+        finder = self._parse(SOURCE)
+        self.assertEquals(finder.get(3, 4).expression, "first")
+        self.assertEquals(finder.get(3, 10).expression, "a")
+        self.assertEquals(finder.get(7, 4).expression, "second")
+
+    def test_update(self):
+        finder = self._parse(SOURCE)
+        source = SOURCE.replace("return os", "x = 1\n    return os")
+        finder.update(source)
+        # Same symbols as parsing the whole source
+        self.assertEquals(repr(finder.symbols),
+                          repr(self._parse(source).symbols))
+        self.assertEquals(finder.get(5, 11).expression, "os")
+        self.assertEquals(finder.get(9, 11).expression, "b")
+        self.assertEquals(finder.get(9, 11).line, 9)
+        self.assertEquals(finder.get(4, 4).expression, "x")
+
+    def test_update_syntax_error(self):
+        finder = self._parse(SOURCE)
+        source = SOURCE.replace("return os", "return '''os")
+        self.assertRaises(SyntaxError, finder.update, source)
+        # Symbols are kept
+        self.assertEquals(finder.get(4, 11).expression, "os")
+
+
+class TestSymbolCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "module.py")
+        self.cache = debugger_plugin.core.symbols.SymbolCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, source, mtime):
+        with open(self.path, "w") as fd:
+            fd.write(source)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_get(self):
+        self._write(SOURCE, 1)
+        finder = self.cache.get(self.path)
+        self.assertEquals(finder.get(4, 11).expression, "os")
+        self.assertTrue(self.cache.get(self.path) is finder)
+        # Changes are seen when the file is modified
+        self._write(SOURCE.replace("os", "sys"), 2)
+        self.assertEquals(self.cache.get(self.path).get(4, 11).expression,
+                          "sys")
+
+    def test_get_syntax_error(self):
+        self._write("a = ", 1)
+        self.assertEquals(self.cache.get(self.path), None)
+
+    def test_get_updated(self):
+        self._write(SOURCE, 1)
+        finder = self.cache.get(self.path)
+        self._write(SOURCE.replace("b.c", "b.d"), 2)
+        self.assertEquals(self.cache.get(self.path).get(8, 13).expression,
+                          "b.d")
+        # Finders already returned are not modified
+        self.assertEquals(finder.get(8, 13).expression, "b.c")
+
+    def test_get_updated_moved(self):
+        self._write(SOURCE, 1)
+        finder = self.cache.get(self.path)
+        symbols = repr(finder.symbols)
+        self._write(SOURCE.replace("import os", "import os\n\n"), 2)
+        self.assertEquals(self.cache.get(self.path).get(10, 11).line, 10)
+        # Finders already returned are not modified, not even their nodes
+        self.assertEquals(repr(finder.symbols), symbols)
+        self.assertEquals(finder.get(8, 11).line, 8)
+
+    def test_cache_dir(self):
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        self._write(SOURCE, 1)
+        cache = debugger_plugin.core.symbols.SymbolCache(cache_dir)
+        cache.get(self.path)
+        self.assertEquals(len(os.listdir(cache_dir)), 1)
+        # Other caches load the symbols of the same contents
+        self._write(SOURCE, 2)
+        cache = debugger_plugin.core.symbols.SymbolCache(cache_dir)
+        self.assertEquals(cache.get(self.path).get(4, 11).expression, "os")
+        self.assertEquals(len(os.listdir(cache_dir)), 1)
+
+    def test_cache_limit(self):
+        cache_dir = os.path.join(self.tmpdir, "cache")
+        cache = debugger_plugin.core.symbols.SymbolCache(cache_dir, 2)
+        for i in xrange(4):
+            self._write("a = {0}".format(i), i)
+            cache.get(self.path)
+        self.assertEquals(len(os.listdir(cache_dir)), 2)
+
+    def test_prefetch(self):
+        self._write(SOURCE, 1)
+        self.cache.start()
+        self.cache.prefetch([self.path, os.path.join(self.tmpdir, "none")])
+        self.cache.stop()
+        self.assertTrue(self.path in self.cache._finders)
+
+    def test_prefetch_from(self):
+        self._write(SOURCE, 1)
+        def fail():
+            raise Exception("Not connected")
+        self.cache.start(1)
+        self.cache.prefetch_from(fail)
+        self.cache.prefetch_from(lambda: [self.path])
+        self.cache.stop()
+        self.assertTrue(self.path in self.cache._finders)
+
+    def test_get_no_wait(self):
+        self._write(SOURCE, 1)
+        self.assertEquals(self.cache.get(self.path, wait=False), None)
+        self.assertEquals(self.cache.get(self.path, wait=False), None)
+        self.assertEquals(self.cache._queue.qsize(), 1)
+        self.cache.start(1)
+        self.cache.stop()
+        finder = self.cache.get(self.path, wait=False)
+        self.assertEquals(finder.get(4, 11).expression, "os")
+
+        # The old symbols are returned until the file is indexed again
+        self._write("\n" + SOURCE, 2)
+        self.assertTrue(self.cache.get(self.path, wait=False) is finder)
+        self.cache.start(1)
+        self.cache.stop()
+        finder = self.cache.get(self.path, wait=False)
+        self.assertEquals(finder.get(5, 11).expression, "os")
+
+
+if __name__ == '__main__':
+    unittest.main()
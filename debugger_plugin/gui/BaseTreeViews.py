@@ -30,8 +30,9 @@ class BaseTreeView(QTreeWidget):
         QTreeWidget.__init__(self)
         self._content_provider = None
         self._label_providers = {}
-        # index table to lookup treeview items associated with model objects.
-        self.__indextable = []
+        # index table to lookup treeview items associated with model objects,
+        # by id of the object.
+        self.__indextable = {}
         self._hide_parent = hide_parent_element
     
     def setContentProvider(self, provider):
@@ -59,7 +60,7 @@ class BaseTreeView(QTreeWidget):
         """
         item = BaseTreeViewItem(parent)
         item.data = data
-        self.__indextable.append(item)
+        self.__indextable[id(data)] = item
         return item
     
     def __addItem(self, parent_item, data, expanded = False):
@@ -72,7 +73,7 @@ class BaseTreeView(QTreeWidget):
             item = self.__newItem(parent_item, data)
         
         # Update its content
-        self.update(data)
+        self.__update(data, False)
         
         # Expand item
         self.setItemExpanded(item, expanded)
@@ -87,7 +88,14 @@ class BaseTreeView(QTreeWidget):
         else:
             root = self.invisibleRootItem()
             root.removeChild(item)
-        self.__indextable.remove(item)
+        self.__unindexItem(item)
+
+    def __unindexItem(self, item):
+        """Remove the treeviewitem and all of its children from the index."""
+        if self.__indextable.get(id(item.data)) is item:
+            del self.__indextable[id(item.data)]
+        for i in xrange(item.childCount()):
+            self.__unindexItem(item.child(i))
     
     def __updateItem(self, item, data):
         """Update the treeviewitem with the data from the data model."""
@@ -104,42 +112,49 @@ class BaseTreeView(QTreeWidget):
             item.setText(column, name)
 
         # Remove old data associated with this item
-        if item.data != data:
+        if item.data is not data:
             # remove old data
+            self.__unindexItem(item)
             del item.data
             item.data = data
+            self.__indextable[id(data)] = item
     
     def findObjectsItem(self, data):
         """Return the BaseTreeViewItem that represents the data."""
-        for item in self.__indextable:
-            if item.data == data:
-                return item
-        return None
+        return self.__indextable.get(id(data))
 
     def update(self, data = None, expand = False):
         """
         Update the specified element in the tree, including the number of
         children. This method, unlike refresh, deals with structural changes.
         """
-        if data is None or data == self._input:
+        # Repaint once, after all the changes
+        self.setUpdatesEnabled(False)
+        try:
+            self.__update(data, expand)
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def __update(self, data, expand):
+        """Update the element and its children (see update)."""
+        if data is None or data is self._input:
             # Remove the top parent
             data = self._input
             item = self.invisibleRootItem()
         else:
             item = self.findObjectsItem(data)
+            if item is None:
+                return
             self.__updateItem(item, data)
         
         children = self._content_provider.getChildren(data)
         
-        # Remove old ones
-        currents = item.takeChildren()
-        for child in currents:
-            if not child.data in children:
-                # Remove child since its not in the new children set
-                item.removeChild(child)
-            else:
-                # Re-added since we took al children.
-                item.addChild(child)
+        # Remove old ones, those not in the new children set
+        wanted = set(id(child) for child in children)
+        for i in reversed(xrange(item.childCount())):
+            child = item.child(i)
+            if id(child.data) not in wanted:
+                self.__removeItem(child)
         
         # Add the rest of the children (__addItem won't add those that are
         # already added).
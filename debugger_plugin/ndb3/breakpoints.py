@@ -1,41 +1,315 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import dis
+import itertools
 import os
+import re
+import threading
+
+_NO_LINES = frozenset()
+# Maximum number of verdicts cached by check_code.
+_CODES_LIMIT = 10000
+# Escaped braces and expressions of the log message templates.
+_TEMPLATE_TOKENS = re.compile(r"(\{\{|\}\}|\{[^{}]*\})")
+
+
+def _code_lines(code):
+    """Return the set of line numbers with instructions of the code object."""
+    return set(line for _, line in dis.findlinestarts(code))
+
+
+def _compile_template(template):
+    """
+    Compile a log message template: text with expressions between braces,
+    e.g. "x is {x}" ({{ and }} are literal braces). Return the list of the
+    literal strings and the code objects of the expressions, in order.
+    Raise SyntaxError if an expression cannot be compiled.
+    """
+    parts = []
+    for token in _TEMPLATE_TOKENS.split(template):
+        if token in ("{{", "}}"):
+            parts.append(token[0])
+        elif token.startswith("{") and token.endswith("}"):
+            parts.append(compile(token[1:-1].strip(), "<logpoint>", "eval"))
+        elif token:
+            parts.append(token)
+    return parts
+
+
+class Breakpoint(object):
+    """
+    Options of a breakpoint. The breakpoint triggers only if the condition
+    (an expression) is true and it was hit at least hit_count times (counting
+    only the hits with a true condition). A breakpoint with a log message (a
+    template, see _compile_template) is a log point: when it triggers the
+    message is formatted and logged, the thread doesn't stop.
+
+    Expressions are compiled once, when the breakpoint is set, so a
+    SyntaxError is raised then.
+    """
+
+    def __init__(self, condition = None, hit_count = 0, log_message = None):
+        self.condition = condition or None
+        self.hit_count = hit_count or 0
+        self.log_message = log_message or None
+        self._condition = None
+        if self.condition:
+            self._condition = compile(self.condition.strip(), "<breakpoint>",
+                                      "eval")
+        self._log_message = None
+        if self.log_message:
+            self._log_message = _compile_template(self.log_message)
+        # Number of hits, incremented atomically
+        self._hits = itertools.count(1)
+
+    def __eq__(self, other):
+        return (isinstance(other, Breakpoint) and
+                (self.condition, self.hit_count, self.log_message) ==
+                (other.condition, other.hit_count, other.log_message))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def hit(self, frame):
+        """
+        Process a hit of the breakpoint at frame. Return True if it triggers,
+        False otherwise. If the condition cannot be evaluated the breakpoint
+        triggers, so the error can be inspected.
+        """
+        if self._condition:
+            try:
+                if not eval(self._condition, frame.f_globals, frame.f_locals):
+                    return False
+            except Exception:
+                return True
+        return next(self._hits) >= self.hit_count
+
+    def format(self, frame):
+        """
+        Return the log message with the values of its expressions evaluated
+        at frame. Expressions that fail are replaced by their error.
+        """
+        pieces = []
+        for part in self._log_message:
+            if isinstance(part, basestring):
+                pieces.append(part)
+                continue
+            try:
+                pieces.append("%s" % (eval(part, frame.f_globals,
+                                           frame.f_locals),))
+            except Exception as err:
+                pieces.append("<%s: %s>" % (err.__class__.__name__, err))
+        return "".join(pieces)
+
+
+def _parse_lines(lines):
+    """
+    Return the frozen set of line numbers and the Breakpoint objects by line
+    number of a list of breakpoints. Each breakpoint is either a line number
+    or a dict with the line and the options of the breakpoint (condition,
+    hit_count and log_message).
+    """
+    numbers = set()
+    options = {}
+    for line in lines:
+        if isinstance(line, dict):
+            opts = dict(line)
+            line = opts.pop('line')
+            bp = Breakpoint(**opts)
+            if bp != _PLAIN:
+                options[line] = bp
+        numbers.add(line)
+    return frozenset(numbers), options
+
+
+# Options of the breakpoints without any.
+_PLAIN = Breakpoint()
+
 
 class BreakpointManager(object):
+    """
+    Registry of the breakpoints of a debugging session. Lookups are indexed
+    by the raw filename of the code objects (co_filename) so checking a
+    position doesn't need to normalize any path. Every change increments
+    the version of the manager, so callers can cache lookups until then.
+    """
 
     def __init__(self):
+        # Frozen sets of line numbers by normalized path.
         self.breakpoints = {}
+        # Breakpoint objects by normalized path and line number, only for
+        # the breakpoints with options.
+        self.options = {}
+        self.version = 0
+        self._lock = threading.Lock()
+        # Memoized normalization of raw filenames.
+        self._paths = {}
+        # Index of raw filenames to frozen sets of line numbers.
+        self._index = {}
+        # Cache of verdicts for check_code, by id of the code object.
+        self._codes = {}
+
+    def _normalize(self, filename):
+        """Return the normalized path of filename."""
+        try:
+            return self._paths[filename]
+        except KeyError:
+            fullpath = os.path.abspath(filename)
+            self._paths[filename] = fullpath
+            return fullpath
+
+    def _lookup(self, filename):
+        """
+        Return the lines with breakpoints for the raw filename and index
+        them. Must be called with the lock held.
+        """
+        lines = self.breakpoints.get(self._normalize(filename), _NO_LINES)
+        self._index[filename] = lines
+        return lines
+
+    def _changed(self):
+        """
+        Drop every lookup derived from the breakpoints and increment the
+        version. Must be called with the lock held.
+        """
+        self._index = {}
+        self._codes = {}
+        self.version += 1
+
+    def add(self, filename, linenumber, condition = None, hit_count = 0,
+            log_message = None):
+        """
+        Add a breaking point in the specified filename and line number, with
+        the specified options (see Breakpoint). Raise SyntaxError if the
+        condition or log message cannot be compiled.
+        """
+        bp = Breakpoint(condition, hit_count, log_message)
+        with self._lock:
+            fullpath = self._normalize(filename)
+            lines = self.breakpoints.get(fullpath, _NO_LINES)
+            key = (fullpath, linenumber)
+            if linenumber in lines and self.options.get(key, _PLAIN) == bp:
+                return
+            self.breakpoints[fullpath] = lines | frozenset([linenumber])
+            self.options.pop(key, None)
+            if bp != _PLAIN:
+                self.options[key] = bp
+            self._changed()
+
+    def set(self, filename, lines):
+        """
+        Replace the breakpoints of the specified filename with lines (line
+        numbers or dicts with the line and its options, see _parse_lines).
+        An empty list of lines removes the breakpoints of the file.
+        """
+        lines, options = _parse_lines(lines)
+        with self._lock:
+            fullpath = self._normalize(filename)
+            old_options = self._file_options(fullpath)
+            if (lines == self.breakpoints.get(fullpath, _NO_LINES) and
+                options == old_options):
+                return
+            if lines:
+                self.breakpoints[fullpath] = lines
+            else:
+                self.breakpoints.pop(fullpath, None)
+            for line in old_options:
+                del self.options[(fullpath, line)]
+            for line, bp in options.iteritems():
+                self.options[(fullpath, line)] = bp
+            self._changed()
+
+    def sync(self, breakpoints):
+        """
+        Replace all the breakpoints, at once, with those in the mapping of
+        filenames to lists of lines (as in set).
+        """
+        with self._lock:
+            new = {}
+            new_options = {}
+            for filename, lines in breakpoints.iteritems():
+                lines, options = _parse_lines(lines)
+                if lines:
+                    fullpath = self._normalize(filename)
+                    new[fullpath] = new.get(fullpath, _NO_LINES) | lines
+                    for line, bp in options.iteritems():
+                        new_options[(fullpath, line)] = bp
+            if new != self.breakpoints or new_options != self.options:
+                self.breakpoints = new
+                self.options = new_options
+                self._changed()
 
-    def add(self, filename, linenumber):
-        """Add a breaking point in the specified filename and line number."""
-        fullpath = os.path.abspath(filename)
-        lines = self.breakpoints.setdefault(fullpath, [])
-        if not linenumber in lines:
-            lines.append(linenumber)
+    def _file_options(self, fullpath):
+        """
+        Return the Breakpoint objects of the file by line number. Must be
+        called with the lock held.
+        """
+        return dict((line, bp) for (path, line), bp in self.options.iteritems()
+                    if path == fullpath)
+
+    def get_breakpoint(self, filename, linenumber):
+        """
+        Return the Breakpoint object with the options of the breakpoint in
+        filename (as found in co_filename) and linenumber, None if it has no
+        options.
+        """
+        if not self.options:
+            return None
+        return self.options.get((self._normalize(filename), linenumber))
+
+    def get_lines(self, filename):
+        """
+        Return the frozen set of line numbers with breakpoints in the
+        specified filename. The filename is expected as found in co_filename.
+        """
+        try:
+            return self._index[filename]
+        except KeyError:
+            with self._lock:
+                return self._lookup(filename)
 
     def check(self, filename, linenumber):
         """
         Check wheather the filename:linenumber is a break point. Return True if
         it is, False otherwise.
         """
-        fullpath = os.path.abspath(filename)
-        if fullpath in self.breakpoints:
-            breaklines = self.breakpoints.get(fullpath, [])
-            return linenumber in breaklines
-        return False
+        try:
+            return linenumber in self._index[filename]
+        except KeyError:
+            return linenumber in self.get_lines(filename)
+
+    def check_code(self, code):
+        """
+        Check whether the code object may stop at a breakpoint, that is, if
+        any of its lines (not those of nested code objects) has a breakpoint.
+        Return True if it may, False otherwise. Verdicts are cached until the
+        breakpoints change.
+        """
+        try:
+            return self._codes[id(code)][1]
+        except KeyError:
+            with self._lock:
+                lines = self._lookup(code.co_filename)
+                result = bool(lines) and not lines.isdisjoint(_code_lines(code))
+                if len(self._codes) >= _CODES_LIMIT:
+                    self._codes = {}
+                # Keep the code object, so its id is not reused
+                self._codes[id(code)] = (code, result)
+                return result
 
     def remove(self, filename = None):
         """
         Clear the registry of breakpoints for a specified file, if not
         specified, clear all breakpoints.
         """
-        if filename:
-            filename = os.path.abspath(filename)
-            try:
-                del self.breakpoints[filename]
-            except:
+        with self._lock:
+            if filename:
                 # Ignore if filename wasn't there in the first place
-                pass
-        else:
-            self.breakpoints = {}
+                fullpath = self._normalize(filename)
+                self.breakpoints.pop(fullpath, None)
+                for line in self._file_options(fullpath):
+                    del self.options[(fullpath, line)]
+            else:
+                self.breakpoints = {}
+                self.options = {}
+            self._changed()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import itertools
 import threading
+import time
 import json
 
 
@@ -63,6 +66,27 @@ class EventFactory:
             'id': thread.id,
         }
     
+    @staticmethod
+    def make_log():
+        """
+        Create the message that indicates that there are new entries in the
+        debugger logs.
+        """
+        return {
+            'type': 'LOG'
+        }
+
+    @staticmethod
+    def make_events_dropped(count):
+        """
+        Create the message that indicates that count events were dropped, so
+        the state of the session must be fetched again.
+        """
+        return {
+            'type': 'EVENTS_DROPPED',
+            'count': count,
+        }
+
     @staticmethod
     def make_debug_start():
         """Create the message that indicates that the debug session ended."""
@@ -76,3 +100,226 @@ class EventFactory:
         return {
             'type': 'DEBUG_END'
         }
+
+
+class EventQueue(object):
+    """
+    Bounded queue of debugger events. Every event gets a sequence number, so
+    clients can wait for the events that came after the last one they've
+    seen.
+
+    Events not delivered yet are coalesced, so clients get a compact delta of
+    the state: a RESUME of a thread followed by a PAUSE is replaced by the
+    PAUSE, and a thread that stops before its creation was delivered leaves
+    no events at all. If more than size events are waiting to be delivered
+    anyway, the oldest ones are dropped and an EVENTS_DROPPED event tells the
+    clients how many, so they can fetch the state again. That event doesn't
+    count against the size.
+
+    LOG and EVENTS_DROPPED events are never dropped: they're sent once until
+    the clients act on them, so the clients would never hear of the logs or
+    the drops again.
+    """
+    # Types of the events that are never dropped.
+    KEPT = frozenset(['LOG', 'EVENTS_DROPPED'])
+
+    def __init__(self, size=10000):
+        """Creates a new empty EventQueue that holds up to size events."""
+        self.size = size
+        self._cond = threading.Condition()
+        self._events = collections.deque()
+        self._seq = 0
+        # Sequence numbers of the events removed by coalescing that are still
+        # in _events (they're skipped when delivered).
+        self._removed = set()
+        # Number of events delivered but not received yet, at the beginning
+        # of _events.
+        self._delivered = 0
+        # Events not delivered yet, by thread id.
+        self._pending = {}
+        # EVENTS_DROPPED event not delivered yet.
+        self._dropped = None
+
+    def put(self, event):
+        """Add the event to the queue and wake up the waiting clients."""
+        with self._cond:
+            if not self._coalesce(event):
+                self._append(event)
+                while (self._undelivered() > max(self.size, 1) and
+                       self._drop_oldest()):
+                    pass
+            self._cond.notify_all()
+
+    def get(self):
+        """Remove and return all the events in the queue."""
+        with self._cond:
+            result = self._deliver()
+            self._events.clear()
+            self._delivered = 0
+            return result
+
+    def wait(self, since_seq=0, timeout=None):
+        """
+        Return the events that came after since_seq, waiting up to timeout
+        seconds for one to arrive if there are none. If timeout is None, wait
+        until there's at least one. Events up to since_seq are considered
+        received and are removed from the queue.
+        """
+        with self._cond:
+            while self._events and self._events[0]['seq'] <= since_seq:
+                seq = self._events.popleft()['seq']
+                if seq in self._removed:
+                    self._removed.discard(seq)
+                elif self._delivered:
+                    self._delivered -= 1
+
+            if timeout is not None:
+                deadline = time.time() + timeout
+            while not self._live():
+                if timeout is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._deliver()
+
+    def _live(self):
+        """Return the number of events in the queue, minus the removed."""
+        return len(self._events) - len(self._removed)
+
+    def _undelivered(self):
+        """
+        Return the number of events not delivered yet, minus the removed and
+        the EVENTS_DROPPED event.
+        """
+        count = len(self._events) - self._delivered - len(self._removed)
+        if self._dropped is not None and self._queued(self._dropped):
+            count -= 1
+        return count
+
+    def _queued(self, event):
+        """Return True if the event is still in the queue."""
+        return (event['seq'] not in self._removed and bool(self._events) and
+                event['seq'] >= self._events[0]['seq'])
+
+    def _append(self, event):
+        """Number and add the event at the end of the queue."""
+        self._seq += 1
+        event['seq'] = self._seq
+        self._events.append(event)
+        if 'id' in event:
+            self._pending.setdefault(event['id'], []).append(event)
+
+    def _remove(self, event):
+        """Remove the event from the queue (see _deliver)."""
+        self._removed.add(event['seq'])
+        if len(self._removed) > self.size:
+            # Don't let the removed events pile up
+            self._events = collections.deque(
+                e for e in self._events if e['seq'] not in self._removed)
+            self._removed.clear()
+
+    def _coalesce(self, event):
+        """
+        Merge the event with the events of its thread not delivered yet.
+        Return True if nothing is left to add to the queue, False otherwise.
+        """
+        tid = event.get('id')
+        if tid is None:
+            return False
+        pending = [e for e in self._pending.get(tid, ()) if self._queued(e)]
+        self._pending[tid] = pending
+        if not pending:
+            return False
+
+        if (event['type'] == 'THREAD_PAUSE' and
+            pending[-1]['type'] == 'THREAD_RESUME'):
+            self._remove(pending.pop())
+        elif (event['type'] == 'THREAD_STOP' and
+              pending[0]['type'] == 'THREAD_CREATE'):
+            # The clients never knew about this thread
+            for e in pending:
+                self._remove(e)
+            del self._pending[tid]
+            return True
+        return False
+
+    def _drop_oldest(self):
+        """
+        Drop the oldest event not delivered yet that can be dropped and count
+        it in an EVENTS_DROPPED event. Return False if no event can be
+        dropped.
+        """
+        for event in itertools.islice(self._events, self._delivered, None):
+            if (event['seq'] not in self._removed and
+                event['type'] not in self.KEPT):
+                break
+        else:
+            return False
+        self._remove(event)
+
+        if self._dropped is not None and self._queued(self._dropped):
+            self._dropped['count'] += 1
+        else:
+            self._dropped = EventFactory.make_events_dropped(1)
+            self._append(self._dropped)
+        return True
+
+    def _deliver(self):
+        """
+        Return the events in the queue. From now on they're delivered, so
+        they're not coalesced anymore.
+        """
+        if self._removed:
+            self._events = collections.deque(
+                e for e in self._events if e['seq'] not in self._removed)
+            self._removed.clear()
+        self._delivered = len(self._events)
+        self._pending = {}
+        self._dropped = None
+        return list(self._events)
+
+
+class LogBuffer(object):
+    """
+    Bounded buffer of log entries (e.g. the messages of log points), drained
+    in batches by the clients. When it's full, the oldest entries are dropped
+    and counted.
+    """
+
+    def __init__(self, size=1000, on_ready=None):
+        """
+        Creates a new LogBuffer that holds up to size entries. The function
+        on_ready is called when the buffer stops being empty, so clients can
+        be told there's something to drain.
+        """
+        self._lock = threading.Lock()
+        self._entries = collections.deque(maxlen=size)
+        self._dropped = 0
+        self.on_ready = on_ready
+
+    def append(self, entry):
+        """Add the entry to the buffer, dropping the oldest one if full."""
+        with self._lock:
+            ready = not self._entries and not self._dropped
+            if len(self._entries) == self._entries.maxlen:
+                self._dropped += 1
+            self._entries.append(entry)
+        if ready and self.on_ready:
+            self.on_ready()
+
+    def drain(self):
+        """
+        Remove and return all the entries in the buffer, along with the
+        number of entries dropped since the last drain.
+        """
+        with self._lock:
+            result = {
+                'entries': list(self._entries),
+                'dropped': self._dropped,
+            }
+            self._entries.clear()
+            self._dropped = 0
+            return result
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module provides filters to choose which files are traced.
+"""
+
+import bisect
+import fnmatch
+import os
+import re
+import site
+import sysconfig
+import threading
+
+# Characters with a special meaning in glob patterns.
+_GLOB_SPECIAL = re.compile(r'([*?[])')
+
+
+def library_paths():
+    """
+    Return the directories of the standard library and the installed
+    packages (site-packages, including those of a virtualenv).
+    """
+    paths = [os.path.dirname(os.__file__)]
+    s_paths = sysconfig.get_paths()
+    for name in ['stdlib', 'platstdlib', 'purelib', 'platlib']:
+        if name in s_paths:
+            paths.append(s_paths[name])
+    # Not available in the site module of old virtualenvs
+    if hasattr(site, 'getsitepackages'):
+        paths.extend(site.getsitepackages())
+    if hasattr(site, 'getusersitepackages'):
+        paths.append(site.getusersitepackages())
+    return paths
+
+
+def escape(path):
+    """Return a glob pattern that matches path literally."""
+    return _GLOB_SPECIAL.sub(r'[\1]', path)
+
+
+class FileFilter(object):
+    """
+    Filter of the files that should not be traced. A file is ignored if it's
+    within one of the ignored directories (prefixes) or if its path or name
+    matches one of the ignored glob patterns. Verdicts are memoized by the
+    raw filename (as found in co_filename).
+    """
+
+    def __init__(self, prefixes = (), patterns = ()):
+        """Creates a new FileFilter that ignores prefixes and patterns."""
+        self._lock = threading.Lock()
+        self.configure(prefixes, patterns)
+
+    def configure(self, prefixes, patterns):
+        """Replace the ignored directories and patterns."""
+        # Sorted index of directories, without the ones that are within
+        # others. This way, only the greatest directory lower than a path can
+        # be a prefix of it.
+        index = []
+        for prefix in sorted(os.path.join(os.path.abspath(p), '')
+                             for p in prefixes):
+            if not index or not prefix.startswith(index[-1]):
+                index.append(prefix)
+
+        regex = None
+        if patterns:
+            regex = re.compile('|'.join(fnmatch.translate(os.path.normcase(p))
+                                        for p in patterns))
+
+        with self._lock:
+            self.prefixes = list(prefixes)
+            self.patterns = list(patterns)
+            self._index = index
+            self._regex = regex
+            self._verdicts = {}
+
+    def ignored(self, filename):
+        """Return True if filename should not be traced, False otherwise."""
+        try:
+            return self._verdicts[filename]
+        except KeyError:
+            with self._lock:
+                result = self._match(filename)
+                self._verdicts[filename] = result
+                return result
+
+    def _match(self, filename):
+        """Return True if filename is within a prefix or matches a pattern."""
+        fullpath = os.path.abspath(filename)
+        pos = bisect.bisect_right(self._index, fullpath)
+        if pos and fullpath.startswith(self._index[pos - 1]):
+            return True
+        if self._regex:
+            fullpath = os.path.normcase(fullpath)
+            if self._regex.match(fullpath):
+                return True
+            return bool(self._regex.match(os.path.basename(fullpath)))
+        return False
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+This module provides handles to refer to the objects of paused threads.
+"""
+
+import functools
+import itertools
+import threading
+
+
+class HandleRegistry(object):
+    """
+    Registry of the objects inspected while threads are paused. Each object
+    is identified by an integer handle, which is valid until the thread that
+    registered it (the owner) resumes its execution.
+    """
+
+    def __init__(self):
+        """Creates a new empty HandleRegistry."""
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Owner, object and expression of each handle.
+        self._objects = {}
+        # Handles of each owner, by id of the object.
+        self._owned = {}
+
+    def register(self, owner, obj, expr):
+        """
+        Return the handle of obj, which was obtained evaluating expr in the
+        context of owner. An object registered twice keeps its handle.
+        """
+        with self._lock:
+            owned = self._owned.setdefault(owner, {})
+            handle = owned.get(id(obj))
+            if handle is None:
+                handle = next(self._ids)
+                owned[id(obj)] = handle
+                self._objects[handle] = (owner, obj, expr)
+            return handle
+
+    def registrar(self, owner):
+        """Return a function to register objects of owner: fn(obj, expr)."""
+        return functools.partial(self.register, owner)
+
+    def get(self, handle):
+        """
+        Return the owner, the object and the expression of the handle. Raise
+        KeyError if the handle is not valid (anymore).
+        """
+        try:
+            return self._objects[handle]
+        except KeyError:
+            raise KeyError("Invalid handle {0}".format(handle))
+
+    def release(self, owner):
+        """Invalidate all the handles of owner, releasing their objects."""
+        with self._lock:
+            owned = self._owned.pop(owner, {})
+            for handle in owned.itervalues():
+                del self._objects[handle]
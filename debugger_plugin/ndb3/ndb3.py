@@ -5,20 +5,25 @@ This module provides objects to manage the execution of the debugger.
 """
 
 import os
-import Queue
 import sys
 import threading
-import time
 
 # Ndb3 imports
 import process
 import threads
 import breakpoints
+import filters
+import handles
 import rpc
 import events
 
-# Debugger internal data
-_IGNORE_FILES = ['threading.py', 'process.py', 'ndb3.py', 'serialize.py', 'rpc.py']
+# Debugger internal files, never traced.
+_INTERNAL_FILES = filters.FileFilter(
+    prefixes=[os.path.dirname(os.path.abspath(__file__))],
+    patterns=[filters.escape(
+        os.path.splitext(os.path.abspath(threading.__file__))[0] + '.py')])
+# Seconds between the checks for a stop while joining the script threads.
+_JOIN_INTERVAL = 0.1
 
 
 class Ndb3(object):
@@ -33,12 +38,19 @@ class Ndb3(object):
         and waiting to be set on running.
         """
         self.sourcefile = sourcefile
-        self.messages = Queue.Queue()
+        self.messages = events.EventQueue()
+        # Messages of the log points, drained by the clients on LOG events.
+        self.logs = events.LogBuffer(on_ready=self._on_logs_ready)
         self.breakpoint_manager = breakpoints.BreakpointManager()
+        # Files not traced unless they have breakpoints ("just my code").
+        self.file_filter = filters.FileFilter(filters.library_paths())
+        self.handles = handles.HandleRegistry()
         self._stop = True
+        # Set once the session is started (or stopped) to wake up run.
+        self._started = threading.Event()
         self.channel = None
-        # Translation table from normalized ids to real ids.
-        self.norm_ids = dict()
+        # NdbThreads of the session, by (normalized) id.
+        self.threads = threads.ThreadRegistry()
 
     def listen(self, port):
         """
@@ -54,15 +66,20 @@ class Ndb3(object):
         Stop execution of the debugged code. Terminate all running threads.
         """
         self._stop = True
+        self._started.set()
         # Resume all threads XXX: TODO:
         for t in self.get_threads():
             t.resume()
+        # Don't wait for the threads of the script anymore (see run)
+        self.threads.notify()
         # Kill communications
-        self.channel.quit()
+        if self.channel:
+            self.channel.quit()
 
     def start(self):
         """Start debugging session."""
         self._stop = False
+        self._started.set()
 
     def run(self):
         """
@@ -70,8 +87,10 @@ class Ndb3(object):
         as clean as we can provide).
         """
         # Wait until we're good to go (start)
-        while self._stop:
-            time.sleep(0.1)
+        self._started.wait()
+        if self._stop:
+            # Stopped before starting
+            return
 
         # Generate end event
         msg = events.EventFactory.make_debug_start()
@@ -97,14 +116,47 @@ class Ndb3(object):
 
         try:
             # Wait for all threads to finish.
-            # XXX: TODO: This approach seems slow... needs improvement
-            while len([self.get_threads()]) > 1 and not self._stop:
-                time.sleep(0.5)
+            self._join_threads()
         finally:
+            # Make sure the output of the script is out before the client
+            # ends the session (and kills the process).
+            sys.stdout.flush()
+            sys.stderr.flush()
             # Generate end event
             msg = events.EventFactory.make_debug_end()
             self.messages.put(msg)
 
+    def _join_threads(self):
+        """
+        Wait until the non-daemon threads of the script finish (as the
+        interpreter does before exiting) or the session is stopped.
+        """
+        current = threading.currentThread()
+        internal = [current, self.channel]
+        current_id = str(current.ident)
+
+        def debugged_threads_done():
+            """Return True when no (other) non-daemon thread is debugged."""
+            if self._stop:
+                return True
+            for t in self.threads.snapshot():
+                if not t.daemon and t.id != current_id:
+                    return False
+            return True
+
+        while not self._stop:
+            # Debugged threads are done on their THREAD_STOP, no need to poll.
+            self.threads.wait_until(debugged_threads_done)
+            # Join the threads through their handles, they may still be
+            # running untraced code (or not be traced at all).
+            pending = [t for t in threading.enumerate()
+                       if not t.daemon and t not in internal]
+            if self._stop or not pending:
+                break
+            for t in pending:
+                while t.isAlive() and not self._stop:
+                    t.join(_JOIN_INTERVAL)
+
     def _trace_dispatch(self, frame, event, arg):
         """
         Initial trace method. Create the NdbThread if it's a new thread
@@ -113,8 +165,7 @@ class Ndb3(object):
         if event not in ['call', 'line', 'return', 'exception']:
             return None
 
-        filename = os.path.basename(frame.f_code.co_filename)
-        if event == 'call' and filename in _IGNORE_FILES:
+        if event == 'call' and self._ignored(frame.f_code):
             return None
 
         if self._stop:
@@ -127,60 +178,88 @@ class Ndb3(object):
         if not t.isAlive():
             return None
 
-        # Thread was already decorated?
-        if not hasattr(t, 'ndb_info'):
+        # Thread was already decorated? A thread can outlive its NdbThread
+        # (e.g. workers of a pool, when the first traced scope returns).
+        info = getattr(t, 'ndb_info', None)
+        if info is None or info.state is None:
             #  Normalize id to string to avoid issue #5
             norm_tid = str(t.ident)
             t.ndb_info = threads.NdbThread(norm_tid, t.name, frame,
                                           debugger=self,
-                                          events_handler=self._on_thread_event)
-            self.norm_ids[norm_tid] = t.ident
+                                          events_handler=self._on_thread_event,
+                                          daemon=t.daemon)
 
         # Return the trace function for this new scope
         return t.ndb_info.trace_dispatch(frame, event, arg)
 
+    def retrace(self):
+        """
+        Trace the running scopes of the debugged threads that may stop at a
+        breakpoint now. Must be called after adding breakpoints.
+        """
+        frames = dict((str(ident), frame)
+                      for ident, frame in sys._current_frames().iteritems())
+        for t in self.get_threads():
+            if t.id in frames:
+                t.retrace(frames[t.id])
+
+    def _ignored(self, code):
+        """
+        Return True if the scope of the code object must not be traced. The
+        files of the debugger are never traced, those in the file filter are
+        only traced if they have breakpoints.
+        """
+        filename = code.co_filename
+        if _INTERNAL_FILES.ignored(filename):
+            return True
+        return (self.file_filter.ignored(filename) and
+                not self.breakpoint_manager.check_code(code))
+
     def _on_thread_event(self, event, thread):
         """Process event from the threads."""
         msg = None
         if event == threads.THREAD_START:
+            self.threads.add(thread)
             msg = events.EventFactory.make_thread_create(thread)
         if event == threads.THREAD_PAUSE:
             msg = events.EventFactory.make_thread_pause(thread)
         if event == threads.THREAD_RESUME:
             msg = events.EventFactory.make_thread_resume(thread)
         if event == threads.THREAD_STOP:
+            self.threads.remove(thread)
             msg = events.EventFactory.make_thread_stop(thread)
+        if event in [threads.THREAD_RESUME, threads.THREAD_STOP]:
+            # Objects of the thread can change from now on.
+            self.handles.release(thread.id)
         if msg:
             self.messages.put(msg)
 
+    def _on_logs_ready(self):
+        """Tell the clients there are new log entries to drain."""
+        self.messages.put(events.EventFactory.make_log())
+
     def get_thread(self, t_id):
         """Return the NdbThread with id=t_id, None if it doesn't exists."""
-        real_tid = self.norm_ids.get(t_id)
-        t = threading._active.get(real_tid, None)
-        info = None
-        if hasattr(t, 'ndb_info') and t.ndb_info.state != None:
-            info = t.ndb_info
-        return info
+        return self.threads.get(t_id)
 
     def get_threads(self):
-        """
-        Return all active NdbThreads. Returns an object that generates the
-        list of threads.
-        """
-        for i in self.norm_ids:
-            t = self.get_thread(i)
-            if t:
-                yield t
+        """Return the list of all active NdbThreads."""
+        return self.threads.snapshot()
 
     def get_messages(self):
         """
         Return the debugger's available messages. Messages allow clients to
         know the current state of the debugging session.
         """
-        result = []
-        while not self.messages.empty():
-            result.append(self.messages.get(block=True))
-        return result
+        return self.messages.get()
+
+    def wait_messages(self, timeout, since_seq=0):
+        """
+        Return the debugger's messages that came after the one with sequence
+        number since_seq. If there are none, wait up to timeout seconds for
+        new messages to arrive.
+        """
+        return self.messages.wait(since_seq, timeout)
 
 
 if __name__ == '__main__':
@@ -198,6 +277,11 @@ if __name__ == '__main__':
     # Start communication interface API
     dbg.listen(8765)
 
+    # Tell the client the debugger is listening, if it's waiting for us.
+    ready_file = os.environ.pop(rpc.READY_FILE_ENV, None)
+    if ready_file:
+        rpc.write_ready_file(ready_file, dbg.channel.server_address[1])
+
     # Set script dirname as first lookup directory
     sys.path.insert(0, os.path.dirname(sys.argv[0]))
 
@@ -4,28 +4,169 @@
 This module provides RPC interaction with the debugger.
 """
 
+import collections
+import functools
+import inspect
+import itertools
+import json
 import logging
+import os
+import Queue
 from SimpleXMLRPCServer import SimpleXMLRPCServer
 import socket
+import struct
 import threading
+import time
 import xmlrpclib
 
 import serialize
+import threads
+
+# First api version that offers the stream channel.
+STREAM_API_VERSION = "0.4"
+
+# Header of the stream frames: length of the payload in network order.
+_FRAME_HEADER = struct.Struct("!I")
+
+# Environment variable with the path of the file the debugger creates once
+# it's ready to accept connections (see write_ready_file).
+READY_FILE_ENV = "NDB3_READY_FILE"
+
+# Default number of frames returned by get_stack_frames.
+FRAME_LIMIT = 20
 
 
 class DebuggerConnectionError(Exception):
     pass
 
 
+def _parse_version(version):
+    """Return the version string as a comparable tuple."""
+    return tuple(int(i) for i in version.split('.'))
+
+
+def write_ready_file(path, port):
+    """
+    Create the file at path with the port the debugger listens on. The file
+    is renamed into place, so it never shows up half written.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fd:
+        fd.write(str(port))
+    os.rename(tmp_path, path)
+
+
+def wait_ready_file(path, timeout=10, delay=0.01, max_delay=0.5, stop=None):
+    """
+    Wait for the debugger to create the ready file at path. Check for it
+    with exponential backoff, starting with delay seconds up to max_delay.
+    Return the port written to the file, None if it didn't show up within
+    timeout seconds or if the stop event (a threading.Event) was set.
+    """
+    if stop is None:
+        stop = threading.Event()
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with open(path) as fd:
+                return int(fd.read())
+        except IOError:
+            pass
+        remaining = deadline - time.time()
+        if remaining <= 0 or stop.wait(min(delay, remaining)):
+            return None
+        delay = min(delay * 2, max_delay)
+
+
+def _encode_frame(obj):
+    """Return the frame to send obj thru a stream channel."""
+    data = json.dumps(obj)
+    return _FRAME_HEADER.pack(len(data)) + data
+
+
+def _recv_exactly(sock, size):
+    """Receive exactly size bytes from sock. Raise EOFError if closed."""
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise EOFError("Connection closed.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+
+def _recv_frame(sock):
+    """Receive a frame from sock and return its decoded content."""
+    size, = _FRAME_HEADER.unpack(_recv_exactly(sock, _FRAME_HEADER.size))
+    return json.loads(_recv_exactly(sock, size))
+
+
+class RequestExecutor(object):
+    """
+    Bounded pool of threads to handle requests. Requests submitted with the
+    same key (e.g. the id of a debugged thread) run one at a time in the
+    order they were submitted, the rest run concurrently.
+    """
+
+    def __init__(self, workers=8):
+        """Creates a new RequestExecutor with the specified threads."""
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._ready = Queue.Queue()
+        # Requests waiting for the running one with the same key.
+        self._waiting = {}
+        for i in xrange(workers):
+            worker = threading.Thread(target=self._work,
+                                      name="RequestExecutor-%d" % i)
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, key, func, *args):
+        """
+        Run func with the specified args in the pool. If key is not None, wait
+        for the previous requests with the same key to finish.
+        """
+        request = (key, func, args)
+        if key is not None:
+            with self._lock:
+                if key in self._waiting:
+                    self._waiting[key].append(request)
+                    return
+                self._waiting[key] = collections.deque()
+        self._ready.put(request)
+
+    def _work(self):
+        """Run the requests as they become ready."""
+        while True:
+            key, func, args = self._ready.get()
+            try:
+                func(*args)
+            except Exception:
+                self.logger.exception("Error handling request.")
+            if key is not None:
+                # Hand over the key to the next request in line
+                with self._lock:
+                    waiting = self._waiting[key]
+                    if waiting:
+                        self._ready.put(waiting.popleft())
+                    else:
+                        del self._waiting[key]
+
+
 class RPCDebuggerAdapter(threading.Thread, SimpleXMLRPCServer):
     """
     Adapter class that receives input from a RPC-channel and routes those
     requests to the debugger. This interface exports thru RPC only the methods
     beggining with "export_".
+
+    Requests are handled concurrently by a bounded pool of threads, so slow
+    requests (or clients waiting for messages) don't hold the others. Only
+    the requests of the stream channel are ordered (see ordering_key).
     """
-    api_version = "0.2"
+    api_version = STREAM_API_VERSION
 
-    def __init__(self, debugger, port=8765):
+    def __init__(self, debugger, port=8765, workers=8):
         """
         Create a new RPCDebuggerAdapter instance. Allow external users
         to interact with the debugger through XML-RPC.
@@ -38,6 +179,47 @@ class RPCDebuggerAdapter(threading.Thread, SimpleXMLRPCServer):
         self.logger = logging.getLogger(__name__)
         self._quit = False
         self._debugger = debugger
+        self._ordered = {}
+        self.executor = RequestExecutor(workers)
+        # Persistent connections channel, on any free port.
+        self.stream = StreamDebuggerChannel(self)
+
+    def process_request(self, request, client_address):
+        """
+        Handle the request in the pool of threads. The method called is only
+        known once the pool reads the request, so XML-RPC requests are not
+        ordered. They don't need to be: RPCDebuggerAdapterClient serializes
+        its XML-RPC calls, each one waits for the response of the previous.
+        """
+        self.executor.submit(None, self._process_request, request,
+                             client_address)
+
+    def _process_request(self, request, client_address):
+        """Handle the request (see SocketServer.ThreadingMixIn)."""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def ordering_key(self, method, params):
+        """
+        Return the key to order the request for method. Requests for methods
+        that take a thread id (tid) as first argument are ordered by thread,
+        so they're handled in the order they were sent. Return None if the
+        request doesn't need to be ordered.
+        """
+        try:
+            ordered = self._ordered[method]
+        except KeyError:
+            func = getattr(self, 'export_' + method, None)
+            args = func and inspect.getargspec(func).args
+            ordered = bool(args) and args[1:2] == ['tid']
+            self._ordered[method] = ordered
+        if ordered and params:
+            return params[0]
+        return None
 
     def _dispatch(self, method, params):
         """
@@ -54,17 +236,23 @@ class RPCDebuggerAdapter(threading.Thread, SimpleXMLRPCServer):
 
     def run(self):
         """Start request handling loop."""
+        self.stream.start()
         while not self._quit:
             self.handle_request()
 
     def quit(self):
         """Stop the request handling loop."""
         self._quit = True
+        self.stream.quit()
 
     def export_ping(self):
         """Return the current debugger version."""
         return self.api_version
 
+    def export_stream_port(self):
+        """Return the port where the stream channel is listening."""
+        return self.stream.port
+
     def export_start(self):
         """Start the debugger session. Return 'OK' if everything is fine."""
         self._debugger.start()
@@ -123,24 +311,141 @@ class RPCDebuggerAdapter(threading.Thread, SimpleXMLRPCServer):
         t_obj = self._debugger.get_thread(tid)
         return t_obj.get_stack()
 
-    def export_set_breakpoint(self, filename, line):
-        """Set the specified line in filename as a breakpoint."""
-        self._debugger.breakpoint_manager.add(filename, line)
+    def export_get_stack_frames(self, tid, start = 0, count = FRAME_LIMIT,
+                                include_locals = False, include_ids = True):
+        """
+        Return count frames of the stack of the specified thread, from its
+        current frame after skipping start frames, and whether there are more
+        frames (has_more). Each frame has its full path, line, function name
+        and, with include_ids, its id: a handle to get its locals (see
+        get_children). Handles keep the locals alive until the thread
+        resumes, so skip them if they're not needed. A thread that is not
+        paused has no frames.
+
+        With include_locals, each frame has its locals serialized without
+        their children, within a budget shared by all the frames. Frames with
+        locals left out are marked with locals_more.
+        """
+        t_obj = self._debugger.get_thread(tid)
+        if t_obj.state != 'paused':
+            # Its frames change (and their locals are written) as it runs
+            return {'frames': [], 'has_more': False}
+        handles = self._debugger.handles.registrar(tid)
+        frames, has_more = t_obj.get_frames(start, count)
+        budget = serialize.NODE_BUDGET
+        result = []
+        for depth, frame in enumerate(frames, start):
+            code = frame.f_code
+            s_frame = {
+                'file': os.path.abspath(code.co_filename),
+                'line': frame.f_lineno,
+                'function': code.co_name,
+            }
+            if include_ids:
+                s_frame['id'] = handles(frame.f_locals,
+                                        "<frame {0}>.f_locals".format(depth))
+            if include_locals:
+                limit = min(budget, serialize.CHILD_LIMIT)
+                s_locals, more = serialize.serialize_vars(frame.f_locals,
+                                                          limit,
+                                                          handles=handles)
+                s_frame['locals'] = s_locals
+                s_frame['locals_more'] = more
+                budget -= len(s_locals)
+            result.append(s_frame)
+        return {'frames': result, 'has_more': has_more}
+
+    def export_set_breakpoint(self, filename, line, condition = None,
+                              hit_count = 0, log_message = None):
+        """
+        Set the specified line in filename as a breakpoint. The thread stops
+        only when the condition is true and the breakpoint was hit at least
+        hit_count times. With a log message, its value is printed instead.
+        """
+        self._debugger.breakpoint_manager.add(filename, line, condition,
+                                              hit_count, log_message)
+        self._debugger.retrace()
         return (filename, line)
 
+    def export_set_breakpoints(self, filename, lines):
+        """
+        Replace the breakpoints of filename with the specified lines. Each
+        line is either a line number or a dict with the line and its options
+        (condition, hit_count and log_message). Return the lines set.
+        """
+        self._debugger.breakpoint_manager.set(filename, lines)
+        self._debugger.retrace()
+        return lines
+
+    def export_sync_breakpoints(self, breakpoints):
+        """
+        Replace all the breakpoints with those in the mapping of filenames to
+        lists of lines, at once.
+        """
+        self._debugger.breakpoint_manager.sync(breakpoints)
+        self._debugger.retrace()
+        return []
+
+    def export_set_file_filter(self, prefixes, patterns):
+        """
+        Set the directories and glob patterns of the files that are not traced
+        unless they have breakpoints. Set both empty to trace every file.
+        """
+        self._debugger.file_filter.configure(prefixes, patterns)
+        return []
+
+    def export_get_logs(self):
+        """
+        Return the entries of the debugger logs (e.g. the messages of the log
+        points) and the number of entries dropped since the last call.
+        """
+        return self._debugger.logs.drain()
+
     def export_clear_breakpoints(self, filename = None):
         """Clear breakpoints for a specified filename."""
         self._debugger.breakpoint_manager.remove(filename)
         return []
 
-    def export_evaluate(self, tid, e_str, depth = 1):
+    def export_evaluate(self, tid, e_str, depth = 1, offset = 0,
+                        limit = serialize.CHILD_LIMIT):
         """
         Evaluate e_str in the context of the globals and locals from
-        the execution frame in the specified thread.
+        the execution frame in the specified thread. Return at most limit
+        children of the result starting at offset.
         """
         t_obj = self._debugger.get_thread(tid)
         result = t_obj.evaluate(e_str)
-        return serialize.serialize(e_str, e_str, result, depth=depth)
+        handles = self._debugger.handles.registrar(tid)
+        return serialize.serialize(e_str, e_str, result, depth=depth,
+                                   offset=offset, limit=limit,
+                                   handles=handles)
+
+    def export_evaluate_many(self, tid, exprs, depth = 1):
+        """
+        Evaluate each expression in exprs in the context of the globals and
+        locals from the execution frame in the specified thread. Return the
+        list of results in the same order as exprs.
+        """
+        t_obj = self._debugger.get_thread(tid)
+        handles = self._debugger.handles.registrar(tid)
+        result = []
+        for e_str in exprs:
+            e_res = t_obj.evaluate(e_str)
+            result.append(serialize.serialize(e_str, e_str, e_res, depth=depth,
+                                              handles=handles))
+        return result
+
+    def export_get_children(self, handle, offset = 0,
+                            limit = serialize.CHILD_LIMIT):
+        """
+        Return the object with the specified handle (obtained from a previous
+        evaluation) with at most limit of its children, starting at offset.
+        Handles are valid until their thread resumes execution.
+        """
+        owner, obj, e_str = self._debugger.handles.get(handle)
+        handles = self._debugger.handles.registrar(owner)
+        return serialize.serialize(e_str, e_str, obj, offset=offset,
+                                   limit=limit, handles=handles)
 
     def export_execute(self, tid, e_str):
         """
@@ -151,27 +456,233 @@ class RPCDebuggerAdapter(threading.Thread, SimpleXMLRPCServer):
         result = t_obj.execute(e_str)
         return serialize.serialize(e_str, e_str, result)
 
+    def export_get_cache_stats(self):
+        """
+        Return the statistics (hits, misses and size) of the cache of
+        compiled expressions.
+        """
+        return threads.code_cache.stats()
+
     def export_list_threads(self):
         """List the running threads."""
-        t_list = []
-        for t in self._debugger.get_threads():
-            t_list.insert(0, (t.id, t.name, t.state))
-        return t_list
+        return [(t.id, t.name, t.state) for t in self._debugger.get_threads()]
 
     def export_get_messages(self):
         """Retrieve the list of unread messages of the debugger."""
         return self._debugger.get_messages()
 
+    def export_wait_messages(self, timeout, since_seq = 0):
+        """
+        Retrieve the list of messages of the debugger that came after the
+        one with sequence number since_seq. Wait up to timeout seconds if
+        there are none.
+        """
+        return self._debugger.wait_messages(timeout, since_seq)
+
+
+
+class StreamDebuggerChannel(threading.Thread):
+    """
+    Channel that routes the requests received thru persistent connections to
+    a RPCDebuggerAdapter. Requests and responses are sent as frames made of
+    the length of the payload (4 bytes, network order) followed by a JSON
+    object:
+
+        request: {"id": 1, "method": "ping", "params": []}
+        response: {"id": 1, "result": "0.4"} or {"id": 1, "error": "..."}
+
+    Requests are pipelined, a client may send several requests without
+    waiting for their responses, which carry the id of their request.
+    Requests are handled by the adapter's executor, those for the same
+    debugged thread in the order they were received.
+    """
+
+    def __init__(self, adapter, port=0):
+        """
+        Create a new StreamDebuggerChannel listening on the specified port, or
+        on any free port if not specified.
+        """
+        threading.Thread.__init__(self, name=str(self.__class__))
+        self.daemon = True
+        self.logger = logging.getLogger(__name__)
+        self._quit = False
+        self._adapter = adapter
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("", port))
+        self.socket.listen(5)
+        self.port = self.socket.getsockname()[1]
+
+    def run(self):
+        """Start accepting connections."""
+        while not self._quit:
+            try:
+                conn, _ = self.socket.accept()
+            except socket.error:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reader = threading.Thread(target=self._serve, args=(conn,))
+            reader.daemon = True
+            reader.start()
+
+    def quit(self):
+        """Stop accepting connections."""
+        self._quit = True
+        try:
+            # Shutdown wakes up the accept call
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.socket.close()
+
+    def _serve(self, conn):
+        """Read the requests from the connection until it's closed."""
+        send_lock = threading.Lock()
+        try:
+            while not self._quit:
+                request = _recv_frame(conn)
+                key = self._adapter.ordering_key(request.get('method'),
+                                                 request.get('params'))
+                self._adapter.executor.submit(key, self._handle, conn,
+                                              send_lock, request)
+        except (EOFError, ValueError, socket.error):
+            pass
+        finally:
+            conn.close()
+
+    def _handle(self, conn, send_lock, request):
+        """Dispatch the request and send its response thru conn."""
+        r_id = request.get('id')
+        try:
+            result = self._adapter._dispatch(request['method'],
+                                             request.get('params', []))
+            frame = _encode_frame({'id': r_id, 'result': result})
+        except Exception as err:
+            # Same format as xmlrpclib faults
+            error = "%s:%s" % (err.__class__, err)
+            frame = _encode_frame({'id': r_id, 'error': error})
+        try:
+            with send_lock:
+                conn.sendall(frame)
+        except socket.error:
+            # Connection closed, nobody to answer.
+            pass
+
+
+class _PendingCall(object):
+    """Response of a call made thru a StreamDebuggerProxy."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._response = None
+
+    def _set(self, response):
+        """Set the response of the call and wake up the waiting threads."""
+        self._response = response
+        self._done.set()
+
+    def result(self):
+        """
+        Wait for the response and return its result. Raise xmlrpclib.Fault if
+        the call failed or socket.error if the connection was lost.
+        """
+        self._done.wait()
+        if self._response is None:
+            raise socket.error("Connection closed.")
+        if 'error' in self._response:
+            raise xmlrpclib.Fault(1, self._response['error'])
+        return self._response.get('result')
+
+
+class StreamDebuggerProxy(object):
+    """
+    Proxy to call the methods of a StreamDebuggerChannel in the fashion of
+    xmlrpclib.ServerProxy (e.g. proxy.ping()). The proxy is thread safe,
+    concurrent calls are pipelined on the same connection.
+    """
+
+    def __init__(self, host, port):
+        """Connects to the StreamDebuggerChannel at host:port."""
+        self._sock = socket.create_connection((host, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._closed = False
+        reader = threading.Thread(target=self._read_responses)
+        reader.daemon = True
+        reader.start()
+
+    def __getattr__(self, name):
+        """Return a function that calls the remote method name."""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self._call, name)
+
+    def _call(self, method, *params):
+        """Call the remote method and return its result."""
+        return self.submit(method, *params).result()
+
+    def submit(self, method, *params):
+        """
+        Send a call to the remote method without waiting for its response.
+        Return a pending call, its result method waits for the response.
+        """
+        call = _PendingCall()
+        with self._lock:
+            if self._closed:
+                raise socket.error("Connection closed.")
+            r_id = next(self._ids)
+            self._pending[r_id] = call
+            try:
+                self._sock.sendall(_encode_frame({'id': r_id,
+                                                  'method': method,
+                                                  'params': params}))
+            except socket.error:
+                del self._pending[r_id]
+                raise
+        return call
+
+    def close(self):
+        """Close the connection. Pending calls fail with socket.error."""
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+
+    def _read_responses(self):
+        """Read the responses and hand them over to the pending calls."""
+        try:
+            while True:
+                response = _recv_frame(self._sock)
+                with self._lock:
+                    call = self._pending.pop(response.get('id'), None)
+                if call:
+                    call._set(response)
+        except (EOFError, ValueError, socket.error):
+            pass
+        finally:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = self._pending, {}
+            for call in pending.values():
+                call._set(None)
 
 
 class RPCDebuggerAdapterClient:
     """
     Threads safe class to control a Debugger using the RPCDebuggerAdapter.
+    Calls made thru the same client are serialized, use different clients
+    to make concurrent calls (e.g. to wait for messages).
 
     A RPCDebuggerAdapterClient object is used to control a RPCDebuggerAdapter
     thru RPC calls over the network.
 
-    By default, the client will try to connect to localhost.
+    By default, the client will try to connect to localhost. If the remote
+    end supports it, calls are made thru a persistent connection (see
+    StreamDebuggerChannel) where concurrent calls are pipelined instead of
+    serialized.
 
        +-------------+               +------------+          +--------+
        |  RPCClient  |+------------->| RPCAdapter |--------->|  Ndb3  |
@@ -179,48 +690,87 @@ class RPCDebuggerAdapterClient:
 
     """
 
-    lock = threading.Lock()
-
-    def __init__(self, host="localhost", port=8765):
-        """Creates a new DebuggerMaster to handle a DebuggerSlave."""
+    def __init__(self, host="localhost", port=8765, stream=True):
+        """
+        Creates a new DebuggerMaster to handle a DebuggerSlave. If stream is
+        False, the client will only use XML-RPC.
+        """
         self.host = host
         self.port = port
+        self.stream = stream
         self.remote = None
+        self.pipelined = False
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
 
     def __safe_call(self, func, *args):
         """
-        Executes an RPC call to a non-threaded RPC server securely. This
-        method uses a thread lock to ensure one call at a time.
+        Executes an RPC call securely. The connection to the server is not
+        thread safe, so this method uses a thread lock to ensure one call at a
+        time.
         """
         if self.remote is None:
             return
 
-        self.lock.acquire()
+        # Pipelined connections don't need to be serialized.
+        locked = not self.pipelined
+        if locked:
+            self.lock.acquire()
         try:
             return func(*args)
         except socket.error:
             raise DebuggerConnectionError("No connection could be made.")
         finally:
-            self.lock.release()
+            if locked:
+                self.lock.release()
 
-    def connect(self, retries=1):
+    def connect(self, retries=1, delay=0.05):
         """
         Connects to the remote end to start the debugging session. Returns True
-        if connection is successful.
+        if connection is successful. Between retries, wait delay seconds,
+        doubling it every time.
         """
+        # Drop the stream of a previous session, calls start over XML-RPC
+        self.disconnect()
         conn_str = "http://{0}:{1}".format(self.host, self.port)
         self.remote = xmlrpclib.Server(conn_str)
         while retries > 0:
             if self.is_alive():
+                self._open_stream()
                 return True
             retries = retries - 1
+            if retries > 0:
+                time.sleep(delay)
+                delay = delay * 2
         return False
 
+    def _open_stream(self):
+        """
+        Switch to the stream channel if the remote end supports it. Keep
+        using XML-RPC otherwise.
+        """
+        if not self.stream:
+            return
+        try:
+            version = self.__safe_call(self.remote.ping)
+            if _parse_version(version) < _parse_version(STREAM_API_VERSION):
+                return
+            port = self.__safe_call(self.remote.stream_port)
+            remote = StreamDebuggerProxy(self.host, port)
+        except (DebuggerConnectionError, socket.error, ValueError):
+            self.logger.info("Stream channel unavailable, using XML-RPC.")
+            return
+        self.remote = remote
+        self.pipelined = True
+
     def disconnect(self):
         """
         Disconnect from the remote end. Always return True
         """
+        if self.pipelined:
+            self.remote.close()
         self.remote = None
+        self.pipelined = False
         return True
 
     def is_alive(self):
@@ -277,24 +827,92 @@ class RPCDebuggerAdapterClient:
         """Return the list of files in the stack for the specifed thread."""
         return self.__safe_call(self.remote.get_stack, t_id)
 
-    def set_breakpoint(self, filename, line):
-        """Set a breakpoint in the specifed file and line."""
-        return self.__safe_call(self.remote.set_breakpoint, filename, line)
+    def get_stack_frames(self, t_id, start = 0, count = FRAME_LIMIT,
+                         include_locals = False, include_ids = True):
+        """
+        Return count frames of the stack of the specified thread, starting
+        at its current frame after skipping start frames, and whether there
+        are more. Optionally, include a summary of the locals of each frame,
+        and skip the ids of the frames.
+        """
+        return self.__safe_call(self.remote.get_stack_frames, t_id, start,
+                                count, include_locals, include_ids)
+
+    def set_breakpoint(self, filename, line, condition = "", hit_count = 0,
+                       log_message = ""):
+        """
+        Set a breakpoint in the specifed file and line. Optionally, stop only
+        when condition is true and after hit_count hits, or print the value of
+        log_message instead of stopping.
+        """
+        return self.__safe_call(self.remote.set_breakpoint, filename, line,
+                                condition, hit_count, log_message)
+
+    def set_breakpoints(self, filename, lines):
+        """
+        Replace the breakpoints of the specified file with lines, either line
+        numbers or dicts with the line and its options.
+        """
+        return self.__safe_call(self.remote.set_breakpoints, filename, lines)
+
+    def sync_breakpoints(self, breakpoints):
+        """
+        Replace all the breakpoints with those in the mapping of filenames to
+        lists of lines.
+        """
+        return self.__safe_call(self.remote.sync_breakpoints, breakpoints)
+
+    def set_file_filter(self, prefixes, patterns):
+        """
+        Set the directories and glob patterns of the files that shouldn't be
+        traced (unless they have breakpoints). By default, the standard
+        library and the installed packages are not traced.
+        """
+        return self.__safe_call(self.remote.set_file_filter, prefixes, patterns)
+
+    def get_logs(self):
+        """
+        Return the pending entries of the debugger logs and the number of
+        entries that were dropped since the last call.
+        """
+        return self.__safe_call(self.remote.get_logs)
 
     def clear_breakpoints(self, filename = None):
         """Clear all breakpoints for a specified filename."""
         return self.__safe_call(self.remote.clear_breakpoints, filename)
 
-    def evaluate(self, t_id, e_str, depth = 1):
+    def evaluate(self, t_id, e_str, depth = 1, offset = 0,
+                 limit = serialize.CHILD_LIMIT):
         """
         Evaluate the expression within the context of the specified debug
         thread. Since eval only evaluates expressions, a call to this method
         with an assignment will fail.
 
+        Only limit children of the result are returned, starting at offset.
+        Results with more children are marked with has_more.
+
         For a deep understanding of the inner working of this method, see:
         http://docs.python.org/2/library/functions.html#eval.
         """
-        return self.__safe_call(self.remote.evaluate, t_id, e_str, depth)
+        return self.__safe_call(self.remote.evaluate, t_id, e_str, depth,
+                                offset, limit)
+
+    def evaluate_many(self, t_id, exprs, depth = 1):
+        """
+        Evaluate a list of expressions within the context of the specified
+        debug thread with a single call. Return the list of results in the
+        same order as exprs.
+        """
+        return self.__safe_call(self.remote.evaluate_many, t_id, exprs, depth)
+
+    def get_children(self, handle, offset = 0, limit = serialize.CHILD_LIMIT):
+        """
+        Return at most limit children, starting at offset, of the evaluated
+        object with the specified handle. Handles are valid until the thread
+        where the object was evaluated resumes execution.
+        """
+        return self.__safe_call(self.remote.get_children, handle, offset,
+                                limit)
 
     def execute(self, t_id, e_str):
         """
@@ -305,6 +923,13 @@ class RPCDebuggerAdapterClient:
         """
         return self.__safe_call(self.remote.execute, t_id, e_str)
 
+    def get_cache_stats(self):
+        """
+        Return the statistics of the cache of compiled expressions on the
+        remote debugger.
+        """
+        return self.__safe_call(self.remote.get_cache_stats)
+
     def list_threads(self):
         """Return the list of active threads on the remote debugger."""
         return self.__safe_call(self.remote.list_threads)
@@ -313,3 +938,11 @@ class RPCDebuggerAdapterClient:
         """Return the list of available messages on the remote debugger."""
         return self.__safe_call(self.remote.get_messages)
 
+    def wait_messages(self, timeout, since_seq = 0):
+        """
+        Return the list of messages on the remote debugger that came after
+        the one with sequence number since_seq. Wait up to timeout seconds
+        for new messages if there are none.
+        """
+        return self.__safe_call(self.remote.wait_messages, timeout, since_seq)
+
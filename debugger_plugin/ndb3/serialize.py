@@ -3,19 +3,105 @@
 """
     Module to serialize objects.
 """
-__all__ = ['serialize']
+import functools
+import itertools
+from repr import Repr
+
+__all__ = ['serialize', 'serialize_vars']
 
 __PLAIN_TYPES__ = [ bool, buffer, file, float, int, long,
                 type(None), object, slice, str, type, ]
 
+# Maximum number of characters of a serialized value.
+REPR_LIMIT = 256
+# Maximum number of children serialized for each value.
+CHILD_LIMIT = 100
+# Maximum number of values serialized on each call to serialize.
+NODE_BUDGET = 1000
+
 
-def serialize(name, expr, result, depth = 1):
+class _Repr(Repr):
+    """
+    Repr that doesn't go thru all the items of big containers: dicts and sets
+    with more items than shown are not sorted, and instances of subclasses
+    of the builtin containers that don't override __repr__ are shown like
+    their base (Repr would build their full repr, then truncate it).
+    """
+    _CONTAINERS = ((dict, 'dict'), (list, 'list'), (tuple, 'tuple'),
+                   (set, 'set'), (frozenset, 'frozenset'))
+
+    def repr1(self, x, level):
+        for base, name in self._CONTAINERS:
+            if isinstance(x, base) and type(x).__repr__ is base.__repr__:
+                return getattr(self, 'repr_' + name)(x, level)
+        return Repr.repr1(self, x, level)
+
+    def repr_dict(self, x, level):
+        if len(x) <= self.maxdict or level <= 0:
+            return Repr.repr_dict(self, x, level)
+        pieces = ['{0}: {1}'.format(self.repr1(key, level - 1),
+                                    self.repr1(x[key], level - 1))
+                  for key in itertools.islice(x, self.maxdict)]
+        return '{%s, ...}' % ', '.join(pieces)
+
+    def repr_set(self, x, level):
+        if len(x) <= self.maxset:
+            return Repr.repr_set(self, x, level)
+        return self._repr_iterable(x, level, 'set([', '])', self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if len(x) <= self.maxfrozenset:
+            return Repr.repr_frozenset(self, x, level)
+        return self._repr_iterable(x, level, 'frozenset([', '])',
+                                   self.maxfrozenset)
+
+
+class _Context(object):
+    """Limits shared by all the values serialized on a call to serialize."""
+
+    def __init__(self, budget, repr_limit, handles):
+        self.budget = budget
+        self.repr_limit = repr_limit
+        self.handles = handles
+        # Build reprs of big containers only up to the limit. Every item
+        # takes at least 3 characters (e.g. "1, "), so there's no point in
+        # going beyond a third of the limit.
+        self._repr = _Repr()
+        items = max(1, repr_limit // 3)
+        self._repr.maxtuple = self._repr.maxlist = items
+        self._repr.maxarray = self._repr.maxdict = items
+        self._repr.maxset = self._repr.maxfrozenset = items
+        self._repr.maxdeque = items
+        self._repr.maxstring = repr_limit
+        self._repr.maxlong = repr_limit
+        self._repr.maxother = repr_limit
+
+    def repr(self, value):
+        """Return the repr of value, truncated to the repr limit."""
+        res = self._repr.repr(value)
+        if len(res) > self.repr_limit:
+            res = res[:self.repr_limit - 3] + '...'
+        return res
+
+
+def serialize(name, expr, result, depth = 1, offset = 0, limit = CHILD_LIMIT,
+              budget = NODE_BUDGET, repr_limit = REPR_LIMIT, handles = None):
     """
     Serialize the result of the expression as a nested array of name, expr and
     value items. Depth argument defines how deep the serialization should go.
-    
+
+    Serialization is bounded: values are truncated to repr_limit characters,
+    only limit children (starting at offset) are serialized for each value
+    and no more than budget values are serialized in total. Values with
+    children left out are marked with has_more, so they can be requested
+    later (with a greater offset).
+
+    If a handles function is specified (fn(obj, expr), see
+    HandleRegistry.registrar), values with children get a handle, which
+    allows to request their children without evaluating expr again.
+
     Example:
-    
+
     >>> deep_dict = {'uno': [1, 11, 111], 'dos': [2, 22, 222],}
     >>> serialize('somename', "deep_dict", deep_dict)
     {
@@ -24,14 +110,17 @@ def serialize(name, expr, result, depth = 1):
         'type': 'dict',
         'value': "{'dos': [2, 22, 222], 'uno': [1, 11, 111]}",
         'has_childs': True,
+        'has_more': False,
         'childs': [{
             'has_childs': True,
+            'has_more': False,
             'expr': "(deep_dict)['dos']",
             'type': 'list',
             'name': 'dos',
             'value': '[2, 22, 222]'
         },{
             'has_childs': True,
+            'has_more': False,
             'expr': "(deep_dict)['uno']",
             'type': 'list',
             'name': 'uno',
@@ -40,50 +129,87 @@ def serialize(name, expr, result, depth = 1):
     }
     (Output of serialize was beautified to show the structure of the result)
     """
+    context = _Context(budget, repr_limit, handles)
+    return _serialize(context, name, expr, result, depth, offset, limit)
+
+
+def serialize_vars(variables, limit = CHILD_LIMIT, repr_limit = REPR_LIMIT,
+                   handles = None):
+    """
+    Serialize the values of the variables (a dict of names to values, e.g.
+    the locals of a frame), sorted by name, without their children. Return
+    the list of at most limit serialized variables and whether some were
+    left out. See serialize for the meaning of the arguments.
+    """
+    context = _Context(limit, repr_limit, handles)
+    names = sorted(variables)
+    result = [_serialize(context, name, name, variables[name], 0, 0, 0)
+              for name in names[:limit]]
+    return result, len(names) > limit
+
+
+def _serialize(context, name, expr, result, depth, offset, limit):
+    """Serialize the result within the limits of the context."""
+    context.budget -= 1
+
     s_res = {}    # serialized result
     s_res['name'] = name
     s_res['expr'] = expr
-    s_res['value'] = repr(result)
-    
+    s_res['value'] = context.repr(result)
+
     result_type = type(result)
     s_res['type'] = result_type.__name__
     s_res['has_childs'] = False
-    
+    s_res['has_more'] = False
+
     if not result_type in __PLAIN_TYPES__:
         # We've got a compound value
         s_res['has_childs'] = True
-    
-    if depth == 0 or not s_res['has_childs']:
+
+    if not s_res['has_childs']:
+        return s_res
+
+    if context.handles:
+        s_res['handle'] = context.handles(result, expr)
+
+    if depth == 0:
         return s_res
-    
+
     s_res['childs'] = []
+    for c_name, c_expr, c_value in _children(expr, result, offset):
+        if len(s_res['childs']) >= limit or context.budget <= 0:
+            # There's at least one more child we're leaving out
+            s_res['has_more'] = True
+            break
+        try:
+            c_val = c_value()
+        except AttributeError as atte:
+            print repr(atte)
+            continue
+        s_child = _serialize(context, c_name, c_expr, c_val, depth - 1, 0,
+                             limit)
+        s_res['childs'].append(s_child)
+
+    return s_res
+
+
+def _children(expr, result, offset = 0):
+    """
+    Generate the name, expression and a function that returns the value of
+    each child of result, starting at offset. Values of attributes are only
+    got when their function is called, so properties of the children left
+    out never run.
+    """
     if isinstance(result, dict):
-        for key, val in result.items():
-            s_child = serialize(
-                    key, "({0})[{1}]".format(expr, repr(key)),
-                    val, depth -1)
-            s_res['childs'].append(s_child)
-    
+        for key, val in itertools.islice(result.iteritems(), offset, None):
+            yield key, "({0})[{1}]".format(expr, repr(key)), lambda val=val: val
+
     elif isinstance(result, list) or isinstance(result, tuple):
-        for key, val in enumerate(result):
-            s_child = serialize(
-                    key, "({0})[{1}]".format(expr, repr(key)),
-                    val, depth -1)
-            s_res['childs'].append(s_child)
+        for key in xrange(offset, len(result)):
+            val = result[key]
+            yield key, "({0})[{1}]".format(expr, repr(key)), lambda val=val: val
     else:
-        attrs = dir(result)
-        for attr in attrs:
-            if attr.startswith('__') or attr.startswith('_'):
-                continue
-            try:
-                val = getattr(result, attr)
-                s_child = serialize(attr,
-                                         "({0}).{1}".format(expr, attr),
-                                         val,
-                                         depth -1)
-                s_res['childs'].append(s_child)
-            except AttributeError as atte:
-                print repr(atte)
-    
-    return s_res
-
+        attrs = [attr for attr in dir(result) if not attr.startswith('_')]
+        for attr in attrs[offset:]:
+            yield (attr, "({0}).{1}".format(expr, attr),
+                   functools.partial(getattr, result, attr))
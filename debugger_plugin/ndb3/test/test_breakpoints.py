@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import sys
+import unittest
+
+import breakpoints
+
+
+class TestBreakpointManager(unittest.TestCase):
+
+    def test_check(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10)
+        self.assertTrue(bpm.check('somefile.py', 10))
+        self.assertFalse(bpm.check('somefile.py', 11))
+        self.assertFalse(bpm.check('otherfile.py', 10))
+
+    def test_remove(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10)
+        bpm.remove('somefile.py')
+        self.assertFalse(bpm.check('somefile.py', 10))
+
+    def test_add_twice(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10)
+        version = bpm.version
+        bpm.add('somefile.py', 10)
+        self.assertEquals(bpm.version, version)
+        self.assertEquals(bpm.get_lines('somefile.py'), frozenset([10]))
+
+    def test_version(self):
+        bpm = breakpoints.BreakpointManager()
+        version = bpm.version
+        bpm.add('somefile.py', 10)
+        self.assertNotEquals(bpm.version, version)
+        version = bpm.version
+        bpm.remove('somefile.py')
+        self.assertNotEquals(bpm.version, version)
+
+    def test_check_cached(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10)
+        self.assertTrue(bpm.check('somefile.py', 10))
+        # A change must not leave stale lookups behind
+        bpm.add('somefile.py', 11)
+        self.assertTrue(bpm.check('somefile.py', 11))
+        bpm.remove()
+        self.assertFalse(bpm.check('somefile.py', 10))
+
+    def test_check_code(self):
+        bpm = breakpoints.BreakpointManager()
+        frame = sys._getframe()
+        code = frame.f_code
+        self.assertFalse(bpm.check_code(code))
+        bpm.add(code.co_filename, frame.f_lineno)
+        self.assertTrue(bpm.check_code(code))
+        bpm.remove()
+        self.assertFalse(bpm.check_code(code))
+
+    def test_check_code_lines(self):
+        bpm = breakpoints.BreakpointManager()
+        code = _get_code()
+        first_line = code.co_firstlineno
+        # Lines of other code objects in the file don't count
+        bpm.add(code.co_filename, first_line - 1)
+        self.assertFalse(bpm.check_code(code))
+        bpm.add(code.co_filename, first_line + 2)
+        self.assertTrue(bpm.check_code(code))
+
+    def test_set(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10)
+        bpm.set('somefile.py', [11, 12])
+        self.assertEquals(bpm.get_lines('somefile.py'), frozenset([11, 12]))
+        version = bpm.version
+        bpm.set('somefile.py', [12, 11])
+        self.assertEquals(bpm.version, version)
+        bpm.set('somefile.py', [])
+        self.assertFalse(bpm.check('somefile.py', 11))
+        self.assertEquals(bpm.breakpoints, {})
+
+    def test_sync(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10)
+        bpm.sync({'otherfile.py': [1, 2], 'emptyfile.py': []})
+        self.assertFalse(bpm.check('somefile.py', 10))
+        self.assertTrue(bpm.check('otherfile.py', 2))
+        self.assertEquals(len(bpm.breakpoints), 1)
+        version = bpm.version
+        bpm.sync({'otherfile.py': [2, 1]})
+        self.assertEquals(bpm.version, version)
+
+    def test_options(self):
+        bpm = breakpoints.BreakpointManager()
+        bpm.add('somefile.py', 10, condition='x > 1')
+        bpm.add('somefile.py', 11)
+        self.assertTrue(bpm.check('somefile.py', 10))
+        self.assertEquals(bpm.get_breakpoint('somefile.py', 10).condition,
+                          'x > 1')
+        self.assertEquals(bpm.get_breakpoint('somefile.py', 11), None)
+        bpm.set('somefile.py', [{'line': 10, 'hit_count': 2}, 11])
+        self.assertEquals(bpm.get_breakpoint('somefile.py', 10).hit_count, 2)
+        bpm.remove('somefile.py')
+        self.assertEquals(bpm.options, {})
+
+    def test_options_syntax_error(self):
+        bpm = breakpoints.BreakpointManager()
+        self.assertRaises(SyntaxError, bpm.add, 'somefile.py', 10, 'x >')
+        self.assertFalse(bpm.check('somefile.py', 10))
+
+
+class TestBreakpoint(unittest.TestCase):
+
+    def test_condition(self):
+        bp = breakpoints.Breakpoint(condition='x > 1')
+        x = 1
+        self.assertFalse(bp.hit(sys._getframe()))
+        x = 2
+        self.assertTrue(bp.hit(sys._getframe()))
+        # Errors stop, so they can be inspected
+        del x
+        self.assertTrue(bp.hit(sys._getframe()))
+
+    def test_hit_count(self):
+        bp = breakpoints.Breakpoint(hit_count=3)
+        frame = sys._getframe()
+        self.assertEquals([bp.hit(frame) for i in xrange(4)],
+                          [False, False, True, True])
+
+    def test_log_message(self):
+        bp = breakpoints.Breakpoint(log_message='x is {x}, {{y}} is {y}')
+        x = 1
+        self.assertEquals(bp.format(sys._getframe()),
+                          "x is 1, {y} is <NameError: name 'y' is not defined>")
+        self.assertRaises(SyntaxError, breakpoints.Breakpoint,
+                          log_message='{x +}')
+
+
+def _get_code():
+    """Return the code object of this function."""
+    return sys._getframe().f_code
+
+
+if __name__ == '__main__':
+    unittest.main()
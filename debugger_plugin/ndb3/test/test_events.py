@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import threading
+import unittest
+
+import events
+
+
+class TestEventQueue(unittest.TestCase):
+
+    def test_sequence(self):
+        queue = events.EventQueue()
+        queue.put({'type': 'A'})
+        queue.put({'type': 'B'})
+        res = queue.get()
+        self.assertEquals([e['seq'] for e in res], [1, 2])
+        self.assertEquals(queue.get(), [])
+
+    def test_wait_since(self):
+        queue = events.EventQueue()
+        queue.put({'type': 'A'})
+        queue.put({'type': 'B'})
+        res = queue.wait(0, 0)
+        self.assertEquals(len(res), 2)
+        # Events already received are dropped
+        res = queue.wait(res[0]['seq'], 0)
+        self.assertEquals([e['type'] for e in res], ['B'])
+        self.assertEquals(queue.wait(res[0]['seq'], 0), [])
+
+    def test_wait_timeout(self):
+        queue = events.EventQueue()
+        self.assertEquals(queue.wait(0, 0.01), [])
+
+    def test_wait_wakeup(self):
+        queue = events.EventQueue()
+        timer = threading.Timer(0.01, queue.put, ({'type': 'A'},))
+        timer.start()
+        res = queue.wait(0, 5)
+        timer.join()
+        self.assertEquals([e['type'] for e in res], ['A'])
+
+    def test_coalesce_resume_pause(self):
+        queue = events.EventQueue()
+        queue.put({'type': 'THREAD_CREATE', 'id': '1'})
+        queue.wait(0, 0)
+        queue.put({'type': 'THREAD_RESUME', 'id': '1'})
+        queue.put({'type': 'THREAD_RESUME', 'id': '2'})
+        queue.put({'type': 'THREAD_PAUSE', 'id': '1', 'line': 2})
+        res = queue.wait(1, 0)
+        self.assertEquals([(e['type'], e['id']) for e in res],
+                          [('THREAD_RESUME', '2'), ('THREAD_PAUSE', '1')])
+        # Delivered events are not coalesced anymore
+        queue.put({'type': 'THREAD_PAUSE', 'id': '2'})
+        res = queue.wait(0, 0)
+        self.assertEquals([e['type'] for e in res],
+                          ['THREAD_RESUME', 'THREAD_PAUSE', 'THREAD_PAUSE'])
+
+    def test_coalesce_short_lived(self):
+        queue = events.EventQueue()
+        queue.put({'type': 'THREAD_CREATE', 'id': '1'})
+        queue.put({'type': 'THREAD_PAUSE', 'id': '1'})
+        queue.put({'type': 'THREAD_STOP', 'id': '1'})
+        self.assertEquals(queue.get(), [])
+        # A thread already known must stop
+        queue.put({'type': 'THREAD_CREATE', 'id': '2'})
+        queue.get()
+        queue.put({'type': 'THREAD_STOP', 'id': '2'})
+        self.assertEquals([e['type'] for e in queue.get()], ['THREAD_STOP'])
+
+    def test_bounded(self):
+        queue = events.EventQueue(size=3)
+        for i in xrange(5):
+            queue.put({'type': 'A', 'value': i})
+        res = queue.get()
+        self.assertEquals([e.get('value') for e in res], [2, 3, None, 4])
+        self.assertEquals(res[2]['type'], 'EVENTS_DROPPED')
+        self.assertEquals(res[2]['count'], 2)
+
+    def test_bounded_first_drop(self):
+        queue = events.EventQueue(size=2)
+        for i in xrange(3):
+            queue.put({'type': 'A', 'value': i})
+        # The EVENTS_DROPPED event doesn't take the place of another one
+        res = queue.get()
+        self.assertEquals([e.get('value') for e in res], [1, 2, None])
+        self.assertEquals(res[2]['count'], 1)
+
+    def test_bounded_delivered(self):
+        queue = events.EventQueue(size=2)
+        queue.put({'type': 'A', 'value': 0})
+        queue.put({'type': 'A', 'value': 1})
+        queue.wait(0, 0)
+        # Delivered events are kept until received, but they don't count
+        queue.put({'type': 'A', 'value': 2})
+        queue.put({'type': 'A', 'value': 3})
+        res = queue.wait(0, 0)
+        self.assertEquals([e.get('value') for e in res], [0, 1, 2, 3])
+        queue.put({'type': 'A', 'value': 4})
+        res = queue.wait(res[2]['seq'], 0)
+        self.assertEquals([e.get('value') for e in res], [3, 4])
+
+    def test_bounded_keeps_dropped(self):
+        queue = events.EventQueue(size=2)
+        for i in xrange(5):
+            queue.put({'type': 'A', 'value': i})
+        # The EVENTS_DROPPED event is the oldest one, but it's kept
+        res = queue.get()
+        self.assertEquals([e.get('value') for e in res], [None, 3, 4])
+        self.assertEquals(res[0]['count'], 3)
+
+    def test_bounded_keeps_log(self):
+        queue = events.EventQueue(size=2)
+        queue.put(events.EventFactory.make_log())
+        for i in xrange(3):
+            queue.put({'type': 'A', 'value': i})
+        res = queue.get()
+        self.assertEquals([e['type'] for e in res],
+                          ['LOG', 'EVENTS_DROPPED', 'A'])
+        self.assertEquals(res[1]['count'], 2)
+
+
+class TestLogBuffer(unittest.TestCase):
+
+    def test_drain(self):
+        ready = []
+        logs = events.LogBuffer(on_ready=lambda: ready.append(True))
+        logs.append('a')
+        logs.append('b')
+        # Only the first entry after a drain tells the clients
+        self.assertEquals(len(ready), 1)
+        self.assertEquals(logs.drain(), {'entries': ['a', 'b'], 'dropped': 0})
+        self.assertEquals(logs.drain(), {'entries': [], 'dropped': 0})
+        logs.append('c')
+        self.assertEquals(len(ready), 2)
+
+    def test_dropped(self):
+        logs = events.LogBuffer(size=2)
+        for entry in 'abcd':
+            logs.append(entry)
+        self.assertEquals(logs.drain(), {'entries': ['c', 'd'], 'dropped': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import json
+import os
+import unittest
+
+import filters
+
+
+class TestFileFilter(unittest.TestCase):
+
+    def test_prefixes(self):
+        f_filter = filters.FileFilter(['/usr/lib/python', '/usr/lib/python/x',
+                                       '/opt/site'])
+        self.assertTrue(f_filter.ignored('/usr/lib/python/json/__init__.py'))
+        self.assertTrue(f_filter.ignored('/usr/lib/python/x/y.py'))
+        self.assertTrue(f_filter.ignored('/opt/site/mod.py'))
+        self.assertFalse(f_filter.ignored('/usr/lib/python2/mod.py'))
+        self.assertFalse(f_filter.ignored('/home/user/mod.py'))
+        self.assertFalse(f_filter.ignored('/a.py'))
+
+    def test_patterns(self):
+        f_filter = filters.FileFilter(patterns=['*/tests/*', 'setup.py'])
+        self.assertTrue(f_filter.ignored('/home/user/tests/test_a.py'))
+        self.assertTrue(f_filter.ignored('/home/user/setup.py'))
+        self.assertFalse(f_filter.ignored('/home/user/mod.py'))
+
+    def test_escape(self):
+        path = '/home/[user]/a*?.py'
+        f_filter = filters.FileFilter(patterns=[filters.escape(path)])
+        self.assertTrue(f_filter.ignored(path))
+        self.assertFalse(f_filter.ignored('/home/u/abc.py'))
+
+    def test_configure(self):
+        f_filter = filters.FileFilter(['/opt/site'])
+        self.assertTrue(f_filter.ignored('/opt/site/mod.py'))
+        f_filter.configure([], [])
+        self.assertFalse(f_filter.ignored('/opt/site/mod.py'))
+
+    def test_library_paths(self):
+        f_filter = filters.FileFilter(filters.library_paths())
+        self.assertTrue(f_filter.ignored(json.__file__))
+        self.assertTrue(f_filter.ignored(os.__file__))
+        self.assertFalse(f_filter.ignored(__file__))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import unittest
+
+import handles
+
+
+class TestHandleRegistry(unittest.TestCase):
+
+    def test_register(self):
+        registry = handles.HandleRegistry()
+        obj = [1, 2, 3]
+        handle = registry.register('1', obj, 'obj')
+        self.assertEquals(registry.get(handle), ('1', obj, 'obj'))
+        # Same object, same handle
+        self.assertEquals(registry.register('1', obj, 'obj'), handle)
+
+    def test_release(self):
+        registry = handles.HandleRegistry()
+        h_one = registry.register('1', [1], 'one')
+        h_two = registry.register('2', [2], 'two')
+        registry.release('1')
+        self.assertRaises(KeyError, registry.get, h_one)
+        self.assertEquals(registry.get(h_two)[2], 'two')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import ndb3
+
+
+SCRIPT = '''
+import threading
+import time
+
+def work():
+    time.sleep(0.2)
+    with open(%(done)r, 'w') as fd:
+        fd.write('done')
+
+def block():
+    threading.Event().wait()
+
+daemon = threading.Thread(target=block)
+daemon.daemon = True
+daemon.start()
+threading.Thread(target=work).start()
+'''
+
+# Script with a non-daemon thread that is never traced.
+SCRIPT_UNTRACED = '''
+import threading
+import time
+
+threading.Thread(target=time.sleep, args=(1,)).start()
+'''
+
+
+class TestNdb3(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_run_joins_threads(self):
+        done = os.path.join(self.tmpdir, 'done')
+        script = os.path.join(self.tmpdir, 'script.py')
+        with open(script, 'w') as fd:
+            fd.write(SCRIPT % {'done': done})
+
+        dbg = ndb3.Ndb3(script)
+        dbg.start()
+        dbg.run()
+
+        # Non-daemon threads are done before the end of the session, daemon
+        # threads are not waited for.
+        self.assertTrue(os.path.exists(done))
+        msgs = dbg.get_messages()
+        self.assertEquals(msgs[-1]['type'], 'DEBUG_END')
+
+    def test_stop_while_joining(self):
+        script = os.path.join(self.tmpdir, 'script.py')
+        with open(script, 'w') as fd:
+            fd.write(SCRIPT_UNTRACED)
+
+        dbg = ndb3.Ndb3(script)
+        dbg.start()
+        timer = threading.Timer(0.05, dbg.stop)
+        timer.start()
+        start = time.time()
+        dbg.run()
+        timer.join()
+
+        # The session ends without waiting for the thread
+        self.assertTrue(time.time() - start < 0.5)
+        msgs = dbg.get_messages()
+        self.assertEquals(msgs[-1]['type'], 'DEBUG_END')
+
+
+if __name__ == '__main__':
+    unittest.main()
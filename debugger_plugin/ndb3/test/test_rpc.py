@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import xmlrpclib
+
+import handles
+import rpc
+import threads
+
+
+class _TestAdapter(object):
+    """Adapter that dispatches calls to its export_ methods."""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.executor = rpc.RequestExecutor(4)
+
+    def _dispatch(self, method, params):
+        return getattr(self, 'export_' + method)(*params)
+
+    def ordering_key(self, method, params):
+        return None
+
+    def export_echo(self, value):
+        return value
+
+    def export_block(self):
+        self.released.wait(5)
+        return self.released.isSet()
+
+    def export_release(self):
+        self.released.set()
+        return True
+
+
+class TestStreamChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = _TestAdapter()
+        self.channel = rpc.StreamDebuggerChannel(self.adapter)
+        self.channel.start()
+        self.proxy = rpc.StreamDebuggerProxy('localhost', self.channel.port)
+
+    def tearDown(self):
+        self.proxy.close()
+        self.channel.quit()
+
+    def test_call(self):
+        self.assertEquals(self.proxy.echo([1, 'a']), [1, 'a'])
+
+    def test_error(self):
+        self.assertRaises(xmlrpclib.Fault, self.proxy.missing)
+
+    def test_pipelined(self):
+        # The second call is answered while the first one is still pending.
+        blocked = self.proxy.submit('block')
+        self.assertTrue(self.proxy.release())
+        self.assertTrue(blocked.result())
+
+
+class TestRequestExecutor(unittest.TestCase):
+
+    def test_ordering(self):
+        executor = rpc.RequestExecutor(4)
+        done = threading.Event()
+        results = []
+        def append(value):
+            results.append(value)
+            if len(results) == 20:
+                done.set()
+        for i in range(20):
+            executor.submit('key', append, i)
+        done.wait(5)
+        self.assertEquals(results, range(20))
+
+    def test_concurrent(self):
+        executor = rpc.RequestExecutor(2)
+        released = threading.Event()
+        done = threading.Event()
+        executor.submit(None, released.wait, 5)
+        executor.submit(None, done.set)
+        self.assertTrue(done.wait(5))
+        released.set()
+
+
+class _TestDebugger(object):
+    """Debugger with a single thread paused at the creator's frame."""
+
+    def __init__(self, frame):
+        self.handles = handles.HandleRegistry()
+        self.thread = threads.NdbThread('1', 'test', frame, self)
+        self.thread.state = 'paused'
+
+    def get_thread(self, tid):
+        return self.thread
+
+
+class TestRPCDebuggerAdapter(unittest.TestCase):
+
+    def setUp(self):
+        self.debugger = _TestDebugger(sys._getframe())
+        self.adapter = rpc.RPCDebuggerAdapter(self.debugger, port=0)
+
+    def tearDown(self):
+        self.adapter.server_close()
+        self.adapter.stream.quit()
+
+    def test_evaluate_many(self):
+        value = 10
+        self.debugger.thread.current_frame = sys._getframe()
+        res = self.adapter.export_evaluate_many('1', ['value', 'value + 1'])
+        self.assertEquals([r['value'] for r in res], ['10', '11'])
+        self.assertEquals([r['expr'] for r in res], ['value', 'value + 1'])
+
+    def test_get_children(self):
+        value = range(10)
+        self.debugger.thread.current_frame = sys._getframe()
+        res = self.adapter.export_evaluate('1', 'value', 0)
+        self.assertFalse('childs' in res)
+        res = self.adapter.export_get_children(res['handle'], 5, 2)
+        self.assertEquals([c['value'] for c in res['childs']], ['5', '6'])
+        self.assertEquals(res['childs'][0]['expr'], '(value)[5]')
+        self.assertTrue(res['has_more'])
+
+
+    def test_get_stack_frames(self):
+        def inner(depth):
+            if depth:
+                return inner(depth - 1)
+            self.debugger.thread.current_frame = sys._getframe()
+            return self.adapter.export_get_stack_frames('1', 1, 2, True)
+        self.debugger.thread._f_origin = sys._getframe()
+        res = inner(3)
+        self.assertTrue(res['has_more'])
+        self.assertEquals([f['function'] for f in res['frames']],
+                          ['inner', 'inner'])
+        frame = res['frames'][0]
+        self.assertEquals(frame['file'],
+                          os.path.abspath(sys._getframe().f_code.co_filename))
+        self.assertEquals([(l['name'], l['value']) for l in frame['locals']],
+                          [('depth', '1'), ('inner', repr(inner)),
+                           ('self', repr(self))])
+        self.assertFalse(frame['locals_more'])
+        res = self.adapter.export_get_children(frame['id'])
+        self.assertEquals(res['expr'], '<frame 1>.f_locals')
+        self.assertEquals(sorted((c['name'], c['value'])
+                                 for c in res['childs']),
+                          [('depth', '1'), ('inner', repr(inner)),
+                           ('self', repr(self))])
+
+    def test_get_stack_frames_origin(self):
+        self.debugger.thread._f_origin = sys._getframe()
+        self.debugger.thread.current_frame = sys._getframe()
+        res = self.adapter.export_get_stack_frames('1')
+        self.assertFalse(res['has_more'])
+        self.assertEquals([f['function'] for f in res['frames']],
+                          ['test_get_stack_frames_origin'])
+        self.assertFalse('locals' in res['frames'][0])
+        res = self.adapter.export_get_stack_frames('1', include_ids=False)
+        self.assertFalse('id' in res['frames'][0])
+
+    def test_get_stack_frames_running(self):
+        self.debugger.thread.state = 'running'
+        res = self.adapter.export_get_stack_frames('1', include_locals=True)
+        self.assertEquals(res, {'frames': [], 'has_more': False})
+
+
+class TestRPCDebuggerAdapterClient(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = rpc.RPCDebuggerAdapter(None, port=0)
+        self.adapter.daemon = True
+        self.adapter.start()
+        self.port = self.adapter.server_address[1]
+
+    def tearDown(self):
+        self.adapter.quit()
+
+    def test_connect_stream(self):
+        client = rpc.RPCDebuggerAdapterClient(port=self.port)
+        self.assertTrue(client.connect())
+        self.assertTrue(client.pipelined)
+        self.assertTrue(client.is_alive())
+        client.disconnect()
+
+    def test_reconnect(self):
+        client = rpc.RPCDebuggerAdapterClient(port=self.port)
+        self.assertTrue(client.connect())
+        stream = client.remote
+        client.port = 1
+        self.assertFalse(client.connect())
+        self.assertRaises(socket.error, stream._sock.fileno)
+        self.assertFalse(client.pipelined)
+        client.port = self.port
+        self.assertTrue(client.connect())
+        self.assertTrue(client.pipelined)
+        client.disconnect()
+
+    def test_ordering_key(self):
+        self.assertEquals(self.adapter.ordering_key('evaluate', ['1', 'a']),
+                          '1')
+        self.assertEquals(self.adapter.ordering_key('resume', []), None)
+        self.assertEquals(self.adapter.ordering_key('ping', []), None)
+        self.assertEquals(self.adapter.ordering_key('missing', ['1']), None)
+
+    def test_connect_xmlrpc(self):
+        client = rpc.RPCDebuggerAdapterClient(port=self.port, stream=False)
+        self.assertTrue(client.connect())
+        self.assertFalse(client.pipelined)
+        self.assertTrue(client.is_alive())
+
+
+class TestReadyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ready')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_wait(self):
+        timer = threading.Timer(0.05, rpc.write_ready_file, (self.path, 8765))
+        timer.start()
+        self.assertEquals(rpc.wait_ready_file(self.path, timeout=5), 8765)
+        timer.join()
+
+    def test_timeout(self):
+        self.assertEquals(rpc.wait_ready_file(self.path, timeout=0.05), None)
+
+    def test_stop(self):
+        stop = threading.Event()
+        timer = threading.Timer(0.05, stop.set)
+        timer.start()
+        start = time.time()
+        self.assertEquals(rpc.wait_ready_file(self.path, stop=stop), None)
+        self.assertTrue(time.time() - start < 5)
+        timer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
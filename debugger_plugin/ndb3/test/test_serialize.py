@@ -62,6 +62,81 @@ class TestSerialization(unittest.TestCase):
         f_child = res['childs'][0]
         self.assertEquals(f_child['type'], 'instancemethod')
         
+    def test_serialize_repr_limit(self):
+        res = serialize.serialize('s', 's', 'a' * 1000, repr_limit=50)
+        self.assertTrue(len(res['value']) <= 50)
+        res = serialize.serialize('l', 'l', range(100000), repr_limit=50)
+        self.assertTrue(len(res['value']) <= 50)
+
+    def test_serialize_repr_limit_containers(self):
+        compared = []
+        class _Key(object):
+            """Key that records its comparisons."""
+            def __cmp__(self, other):
+                compared.append(self)
+                return cmp(id(self), id(other))
+        big = dict((_Key(), i) for i in xrange(1000))
+        res = serialize.serialize('d', 'd', big, repr_limit=50)
+        self.assertTrue(len(res['value']) <= 50)
+        # Big dicts are not sorted to show a few items
+        self.assertEquals(compared, [])
+
+        shown = []
+        class _Item(object):
+            """Item that records its reprs."""
+            def __repr__(self):
+                shown.append(self)
+                return 'i'
+        class _List(list):
+            """List that keeps the repr of its base."""
+        res = serialize.serialize('l', 'l', _List([_Item()] * 1000), 0,
+                                  repr_limit=50)
+        self.assertTrue(len(res['value']) <= 50)
+        # Only the items shown are built
+        self.assertTrue(len(shown) <= 50)
+
+    def test_serialize_pagination(self):
+        res = serialize.serialize('l', 'l', range(100), offset=10, limit=20)
+        self.assertEquals(len(res['childs']), 20)
+        self.assertEquals(res['childs'][0]['name'], 10)
+        self.assertEquals(res['childs'][0]['expr'], '(l)[10]')
+        self.assertTrue(res['has_more'])
+        # Last page
+        res = serialize.serialize('l', 'l', range(100), offset=90, limit=20)
+        self.assertEquals(len(res['childs']), 10)
+        self.assertFalse(res['has_more'])
+
+    def test_serialize_pagination_properties(self):
+        calls = []
+        class _TestObject(object):
+            """Class with properties that record their calls."""
+            a = property(lambda self: calls.append('a'))
+            b = property(lambda self: calls.append('b'))
+            c = property(lambda self: calls.append('c'))
+        res = serialize.serialize('o', 'o', _TestObject(), offset=1, limit=1)
+        self.assertEquals([c['name'] for c in res['childs']], ['b'])
+        self.assertTrue(res['has_more'])
+        # Only the properties returned are evaluated
+        self.assertEquals(calls, ['b'])
+
+    def test_serialize_budget(self):
+        d_list = [range(10) for i in range(10)]
+        res = serialize.serialize('d', 'd', d_list, 2, budget=15)
+        count = len(res['childs']) + sum(len(c['childs']) for c in res['childs'])
+        self.assertEquals(count, 14)
+        self.assertTrue(res['has_more'])
+
+
+class TestSerializeVars(unittest.TestCase):
+
+    def test_serialize_vars(self):
+        res, more = serialize.serialize_vars({'b': [1], 'a': 1, 'c': 'x'}, 2)
+        self.assertEquals([v['name'] for v in res], ['a', 'b'])
+        self.assertTrue(more)
+        # Children are never serialized
+        self.assertTrue(res[1]['has_childs'])
+        self.assertFalse('childs' in res[1])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
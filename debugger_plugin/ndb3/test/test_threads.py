@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 *-*
+import os
+import sys
+import threading
+import unittest
+
+import breakpoints
+import events
+import threads
+
+
+class _TestDebugger(object):
+    """Minimal debugger to create NdbThreads."""
+
+    def __init__(self):
+        self.breakpoint_manager = breakpoints.BreakpointManager()
+        self.logs = events.LogBuffer()
+
+
+# Code executed to get real frames, from a file of its own.
+_SCOPE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'scope.py')
+_SCOPE_SOURCE = """import sys
+
+
+def outer(frames):
+    frames.append(sys._getframe())
+    return inner(frames)
+
+
+def inner(frames):
+    frames.append(sys._getframe())
+    return frames
+"""
+# Lines of outer and inner: their first statement and their return.
+_OUTER_LINE = 5
+_OUTER_RETURN = 6
+_INNER_LINE = 10
+_INNER_RETURN = 11
+_SCOPE = {}
+exec compile(_SCOPE_SOURCE, _SCOPE_FILE, 'exec') in _SCOPE
+
+
+def _run_scope():
+    """
+    Run outer (which calls inner) and return their frames. Both finished at
+    their return line.
+    """
+    return _SCOPE['outer']([])
+
+
+class TestCodeCache(unittest.TestCase):
+
+    def test_compile(self):
+        cache = threads.CodeCache()
+        code = cache.compile('1 + 1', 'eval')
+        self.assertEquals(eval(code), 2)
+        self.assertTrue(cache.compile('1 + 1', 'eval') is code)
+        self.assertEquals(cache.stats(),
+                          {'hits': 1, 'misses': 1, 'size': 1})
+        self.assertRaises(SyntaxError, cache.compile, 'a = ', 'exec')
+
+    def test_lru(self):
+        cache = threads.CodeCache(2)
+        cache.compile('1', 'eval')
+        cache.compile('2', 'eval')
+        cache.compile('1', 'eval')
+        cache.compile('3', 'eval')
+        # '2' was the least recently used
+        self.assertEquals(cache.stats()['size'], 2)
+        cache.compile('1', 'eval')
+        self.assertEquals(cache.stats()['misses'], 3)
+        cache.compile('2', 'eval')
+        self.assertEquals(cache.stats()['misses'], 4)
+
+
+class TestThreadRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.debugger = _TestDebugger()
+        self.registry = threads.ThreadRegistry()
+
+    def _make_thread(self, tid):
+        return threads.NdbThread(tid, 'test', sys._getframe(), self.debugger,
+                                 events_handler=self._on_thread_event)
+
+    def _on_thread_event(self, event, thread):
+        if event == threads.THREAD_START:
+            self.registry.add(thread)
+        if event == threads.THREAD_STOP:
+            self.registry.remove(thread)
+
+    def test_add_remove(self):
+        thread = self._make_thread('1')
+        self.assertTrue(self.registry.get('1') is thread)
+        self.assertEquals(self.registry.snapshot(), [thread])
+        thread.stop()
+        self.assertEquals(self.registry.get('1'), None)
+        self.assertEquals(len(self.registry), 0)
+
+    def test_remove_replaced(self):
+        old = self._make_thread('1')
+        new = self._make_thread('1')
+        # The stop of a replaced thread must not unregister the new one
+        old.stop()
+        self.assertTrue(self.registry.get('1') is new)
+
+
+class TestNdbThread(unittest.TestCase):
+
+    def setUp(self):
+        self.debugger = _TestDebugger()
+        self.thread = threads.NdbThread('1', 'test', sys._getframe(),
+                                        self.debugger)
+
+    def test_trace_origin(self):
+        frame = self.thread._f_origin
+        res = self.thread.trace_dispatch(frame, 'call', None)
+        self.assertEquals(res, self.thread.trace_dispatch)
+
+    def test_trace_gate(self):
+        outer, inner = _run_scope()
+        self.assertEquals(self.thread.trace_dispatch(inner, 'call', None),
+                          None)
+        # A breakpoint in the code makes the scope traceable, but not the
+        # scopes around it
+        self.debugger.breakpoint_manager.add(_SCOPE_FILE, _INNER_LINE)
+        res = self.thread.trace_dispatch(inner, 'call', None)
+        self.assertEquals(res, self.thread.trace_dispatch)
+        self.assertEquals(self.thread.trace_dispatch(outer, 'call', None),
+                          None)
+
+    def test_trace_gate_run(self):
+        self.debugger.breakpoint_manager.add(_SCOPE_FILE, _INNER_LINE,
+                                             condition='False')
+        traced = []
+        stop_frame = self.thread._stop_frame
+        def record(frame, event):
+            traced.append((frame.f_code.co_name, event, frame.f_lineno))
+            return stop_frame(frame, event)
+        self.thread._stop_frame = record
+        sys.settrace(self.thread.trace_dispatch)
+        try:
+            _run_scope()
+        finally:
+            sys.settrace(None)
+        # Only the lines of the code with the breakpoint are traced
+        self.assertEquals([(n, l) for n, e, l in traced if e == 'line'],
+                          [('inner', _INNER_LINE), ('inner', _INNER_RETURN)])
+
+    def test_trace_gate_step_into(self):
+        frame = _run_scope()[1]
+        self.thread._f_cmd = threads.NdbThread.CMD_STEP_INTO
+        res = self.thread.trace_dispatch(frame, 'call', None)
+        self.assertEquals(res, self.thread.trace_dispatch)
+
+    def test_retrace(self):
+        self.thread._f_origin = sys._getframe()
+        outer, inner = _run_scope()
+        self.thread.retrace(inner)
+        self.assertEquals(inner.f_trace, None)
+        # A breakpoint set after the call makes the running scope traced
+        self.debugger.breakpoint_manager.add(_SCOPE_FILE, _INNER_LINE)
+        self.thread.retrace(inner)
+        self.assertEquals(inner.f_trace, self.thread.trace_dispatch)
+        self.assertEquals(outer.f_trace, None)
+
+    def test_stop_frame_breakpoint(self):
+        frame = _run_scope()[1]
+        f_path = frame.f_code.co_filename
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), None)
+        # New breakpoints must be seen even after a cached lookup
+        self.debugger.breakpoint_manager.add(f_path, frame.f_lineno)
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), frame)
+
+    def test_stop_frame_condition(self):
+        frame = _run_scope()[1]
+        f_path = frame.f_code.co_filename
+        self.debugger.breakpoint_manager.add(f_path, frame.f_lineno,
+                                             condition='frames is None')
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), None)
+        self.debugger.breakpoint_manager.add(f_path, frame.f_lineno,
+                                             condition='frames is not None')
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), frame)
+
+    def test_stop_frame_return_line(self):
+        frame = _run_scope()[1]
+        f_path = frame.f_code.co_filename
+        self.debugger.breakpoint_manager.add(f_path, frame.f_lineno,
+                                             hit_count=2)
+        # The line and the return of the same pass are a single hit
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), None)
+        self.assertEquals(self.thread._stop_frame(frame, 'return'), None)
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), frame)
+
+    def test_stop_frame_log_point(self):
+        frame = _run_scope()[1]
+        f_path = frame.f_code.co_filename
+        self.debugger.breakpoint_manager.add(f_path, frame.f_lineno,
+                                             log_message='at {len(frames)}')
+        self.assertEquals(self.thread._stop_frame(frame, 'line'), None)
+        entries = self.debugger.logs.drain()['entries']
+        self.assertEquals([e['message'] for e in entries], ['at 2'])
+
+    def test_get_frames(self):
+        self.thread._f_origin = sys._getframe()
+        self.thread.current_frame = _run_scope()[1]
+        frames, more = self.thread.get_frames(0, 2)
+        self.assertEquals([f.f_code.co_name for f in frames],
+                          ['inner', 'outer'])
+        self.assertTrue(more)
+        # Frames above the origin are not part of the thread
+        frames, more = self.thread.get_frames(2)
+        self.assertEquals([f.f_code.co_name for f in frames],
+                          ['_run_scope', 'test_get_frames'])
+        self.assertFalse(more)
+        self.assertEquals(self.thread.get_frames(4, 5), ([], False))
+
+    def test_get_stack(self):
+        self.thread.current_frame = _run_scope()[1]
+        stack = self.thread.get_stack()
+        # The first entry is the upper frame, the last one the current frame
+        self.assertEquals(stack[-2:], [('scope.py', _OUTER_RETURN),
+                                       ('scope.py', _INNER_RETURN)])
+
+    def test_stop_frame_log_point_return_line(self):
+        frame = _run_scope()[1]
+        f_path = frame.f_code.co_filename
+        self.debugger.breakpoint_manager.add(f_path, frame.f_lineno,
+                                             log_message='done')
+        for event in ('line', 'return'):
+            self.assertEquals(self.thread._stop_frame(frame, event), None)
+        # A single message for each execution of the line
+        self.assertEquals(len(self.debugger.logs.drain()['entries']), 1)
+
+    def test_evaluate(self):
+        value = 10
+        self.thread.current_frame = sys._getframe()
+        self.assertEquals(self.thread.evaluate(' value + 1'), 11)
+        self.assertTrue(isinstance(self.thread.evaluate('value +'),
+                                   SyntaxError))
+        self.assertEquals(self.thread.execute('value = 1'), '')
+
+    def test_wait_resume(self):
+        paused = threading.Event()
+        def handler(event, thread):
+            if event == threads.THREAD_PAUSE:
+                paused.set()
+        self.thread.events_handler = handler
+
+        waiter = threading.Thread(target=self.thread._wait)
+        waiter.start()
+        paused.wait(5)
+        self.assertEquals(self.thread.state, 'paused')
+        self.thread.resume()
+        waiter.join(5)
+        self.assertFalse(waiter.isAlive())
+        self.assertEquals(self.thread.state, 'running')
+
+
+if __name__ == '__main__':
+    unittest.main()
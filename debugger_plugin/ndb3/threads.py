@@ -4,10 +4,11 @@
 This module provides objects to manage the execution of the debugger.
 """
 
+import collections
+import itertools
 import os
 import Queue
 import sys
-import time
 import threading
 
 THREAD_START = "THREAD_STARTED"
@@ -15,6 +16,114 @@ THREAD_PAUSE = "THREAD_PAUSE"
 THREAD_RESUME = "THREAD_RESUME"
 THREAD_STOP = "THREAD_STOP"
 
+
+class CodeCache(object):
+    """
+    LRU cache of the code objects compiled from the expressions evaluated and
+    executed by the threads. Code objects are keyed by source and mode.
+    """
+
+    def __init__(self, size=256):
+        """Creates a new CodeCache that holds up to size code objects."""
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._codes = collections.OrderedDict()
+
+    def compile(self, source, mode):
+        """
+        Return the code object for source compiled in the specified mode (as
+        in the compile builtin). Raise SyntaxError if it cannot be compiled.
+        """
+        key = (source, mode)
+        with self._lock:
+            code = self._codes.pop(key, None)
+            if code is not None:
+                # Re-insert it as the most recently used
+                self._codes[key] = code
+                self.hits += 1
+                return code
+            self.misses += 1
+
+        code = compile(source, "<string>", mode)
+        with self._lock:
+            self._codes[key] = code
+            while len(self._codes) > self.size:
+                self._codes.popitem(last=False)
+        return code
+
+    def stats(self):
+        """Return the number of hits, misses and code objects cached."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._codes),
+            }
+
+
+# Cache shared by all threads
+code_cache = CodeCache()
+
+
+class ThreadRegistry(object):
+    """
+    Registry of the NdbThreads of a debugging session, by id. Threads are
+    added when they start and removed when they stop, so lookups don't need
+    to scan the threads of the interpreter.
+    """
+
+    def __init__(self):
+        # Signalled every time a thread is added or removed (see wait_until)
+        self._cond = threading.Condition()
+        self._threads = {}
+
+    def add(self, thread):
+        """Register thread, replacing any other thread with the same id."""
+        with self._cond:
+            self._threads[thread.id] = thread
+            self._cond.notify_all()
+
+    def remove(self, thread):
+        """
+        Unregister thread. A thread that was replaced by another one with the
+        same id (e.g. a new NdbThread for the same interpreter thread) is
+        ignored.
+        """
+        with self._cond:
+            if self._threads.get(thread.id) is thread:
+                del self._threads[thread.id]
+                self._cond.notify_all()
+
+    def get(self, tid):
+        """Return the thread with id=tid, None if it doesn't exists."""
+        return self._threads.get(tid)
+
+    def snapshot(self):
+        """Return the list of the registered threads."""
+        with self._cond:
+            return self._threads.values()
+
+    def wait_until(self, predicate):
+        """
+        Wait until predicate() is True. The predicate is checked with the
+        registry locked, every time a thread is added or removed or notify
+        is called.
+        """
+        with self._cond:
+            while not predicate():
+                self._cond.wait()
+
+    def notify(self):
+        """Wake up the waiters to check their predicates again."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._threads)
+
+
 class NdbThread:
     """
     NdbThread class represents a Thread in the debugging session. Every
@@ -27,23 +136,32 @@ class NdbThread:
     CMD_STEP_INTO = "Into"
     CMD_STEP_OUT = "Out"
 
-    def __init__(self, tid, name, frame, debugger, events_handler = None):
+    def __init__(self, tid, name, frame, debugger, events_handler = None,
+                 daemon = False):
         """
-        Create a new NdbThread from a frame with an id and a name.
+        Create a new NdbThread from a frame with an id and a name. The daemon
+        flag is the one of the interpreter thread.
 
         def events_hanlder(id, ndbthread)
         """
         self.id = tid
         self.name = name
+        self.daemon = daemon
         self._f_origin = frame
         self.current_frame = frame
         self._f_stop = None
         self._f_cmd = NdbThread.CMD_RUN
         self.state = 'running'
+        # Condition to park the thread while paused (see _wait)
+        self._resumed = threading.Condition()
         self.debugger = debugger
+        # Breakpoints lookup cache (see _breaklines)
+        self._bp_path = None
+        self._bp_version = None
+        self._bp_lines = None
 
         # Default handler
-        self.events_handler = lambda x: None
+        self.events_handler = lambda event, thread: None
         if events_handler:
             self.events_handler = events_handler
 
@@ -63,6 +181,11 @@ class NdbThread:
         if not self._f_origin:
             return None
 
+        # Don't trace new scopes that cannot possibly stop, they will run at
+        # full speed without a local trace function.
+        if event == 'call' and not self._needs_trace(frame):
+            return None
+
         # Set current frame
         self.current_frame = frame
 
@@ -70,7 +193,9 @@ class NdbThread:
         # we are "executing" for example for returns we stop on the caller.
         s_frame = self._stop_frame(frame, event)
         if s_frame:
-            self.state = 'paused'
+            # The stop frame may not be traced (e.g. the caller on a return),
+            # make sure it is, so we can step from there.
+            s_frame.f_trace = self.trace_dispatch
             self._wait()
 
         f_path = frame.f_code.co_filename
@@ -79,6 +204,31 @@ class NdbThread:
         # Return trace function
         return self.trace_dispatch
 
+    def _needs_trace(self, frame):
+        """
+        Return True if the frame needs a local trace function, that is, if
+        it's the origin frame, we're stepping into new scopes or its code has
+        breakpoints. Return False otherwise.
+
+        While running to a breakpoint only the calls are traced, and the
+        lines only within the code objects that contain breakpoints.
+        """
+        if frame is self._f_origin or self._f_cmd is NdbThread.CMD_STEP_INTO:
+            return True
+        return self.debugger.breakpoint_manager.check_code(frame.f_code)
+
+    def retrace(self, frame):
+        """
+        Set the trace function of the frames of this thread, from frame (the
+        innermost one) up to the origin frame, that need it now. Scopes that
+        were called without a local trace function wouldn't stop at the
+        breakpoints set after the call otherwise.
+        """
+        while frame is not None and frame is not self._f_origin:
+            if frame.f_trace is None and self._needs_trace(frame):
+                frame.f_trace = self.trace_dispatch
+            frame = frame.f_back
+
     def _stop_frame(self, frame, event):
         """
         Return the corresponding stop frame for the current position (defined
@@ -103,21 +253,55 @@ class NdbThread:
                 if frame is self._f_stop:
                     return frame
 
-        # If we've hit a breakpoint we should stop at the current frame
+        # If we've hit a breakpoint we should stop at the current frame. Only
+        # line events count, the other events of the same line (e.g. the
+        # return) would hit the breakpoint again.
+        if event is not 'line':
+            return None
         f_path = frame.f_code.co_filename
-        f_line = frame.f_lineno
-
-        if self.debugger.breakpoint_manager.check(f_path, f_line):
-            return frame
+        if frame.f_lineno in self._breaklines(f_path):
+            bp = self.debugger.breakpoint_manager.get_breakpoint(f_path,
+                                                                 frame.f_lineno)
+            if bp is None:
+                return frame
+            if bp.hit(frame):
+                if not bp.log_message:
+                    return frame
+                # Log points never stop
+                self._log(frame, bp.format(frame))
         return None
 
+    def _log(self, frame, message):
+        """Add the message of a log point at frame to the debugger logs."""
+        self.debugger.logs.append({
+            'id': self.id,
+            'file': frame.f_code.co_filename,
+            'line': frame.f_lineno,
+            'message': message,
+        })
+
+    def _breaklines(self, f_path):
+        """
+        Return the lines with breakpoints in the specified file. The lookup
+        is cached until the file or the breakpoints change.
+        """
+        manager = self.debugger.breakpoint_manager
+        if f_path is not self._bp_path or manager.version != self._bp_version:
+            self._bp_version = manager.version
+            self._bp_lines = manager.get_lines(f_path)
+            self._bp_path = f_path
+        return self._bp_lines
+
     def _wait(self):
         """Stop the thread until the status change to other than PAUSED."""
+        with self._resumed:
+            self.state = 'paused'
         # Handle thread pause event
         self.events_handler(THREAD_PAUSE, self)
-        # Wait for state to change
-        while self.state == 'paused':
-            time.sleep(0.1)
+        # Wait for state to change, _continue and stop will wake us up.
+        with self._resumed:
+            while self.state == 'paused':
+                self._resumed.wait()
 
     def name(self):
         """Return the name of the NdbThread."""
@@ -134,22 +318,27 @@ class NdbThread:
             # Handle thread stop event
             self.events_handler(THREAD_STOP, self)
         # Clear thread info
-        self._f_origin = None
-        self.current_frame = None # Release current frame
-        self._f_stop = None
-        self._f_cmd = None
-        self.state = None
+        with self._resumed:
+            self._f_origin = None
+            self.current_frame = None # Release current frame
+            self._f_stop = None
+            self._f_cmd = None
+            self.state = None
+            self._resumed.notify_all()
 
     def _continue(self, command, stop):
         """Continue execution with the specified command."""
-        if self._f_origin:
-            # Set stop information
-            self._f_stop = stop
-            self._f_cmd = command
-            self.state = 'running'
-            # Handle thread resume event
-            self.events_handler(THREAD_RESUME, self)
-        return self.state
+        with self._resumed:
+            if self._f_origin:
+                # Set stop information
+                self._f_stop = stop
+                self._f_cmd = command
+                self.state = 'running'
+                # Handle thread resume event before waking up the thread, so
+                # it's notified before any new pause.
+                self.events_handler(THREAD_RESUME, self)
+                self._resumed.notify_all()
+            return self.state
 
     def resume(self):
         """Make this thread resume execution after a stop."""
@@ -178,10 +367,32 @@ class NdbThread:
         while index_f is not None:
             f_name = os.path.basename(index_f.f_code.co_filename)
             f_line = index_f.f_lineno
-            stack.insert(0, (f_name, f_line))
+            stack.append((f_name, f_line))
             index_f = index_f.f_back
+        stack.reverse()
         return stack
 
+    def get_frames(self, start = 0, count = None):
+        """
+        Return the list of up to count frames of the stack, starting from the
+        current frame (the innermost one) after skipping start frames, and
+        whether there are more frames beyond them. Only the frames of the
+        debugged code are returned, up to the origin frame.
+        """
+        if count is None:
+            return list(itertools.islice(self._stack(), start, None)), False
+        frames = list(itertools.islice(self._stack(), start, start + count + 1))
+        return frames[:count], len(frames) > count
+
+    def _stack(self):
+        """Generate the frames from the current one up to the origin."""
+        frame = self.current_frame
+        while frame is not None:
+            yield frame
+            if frame is self._f_origin:
+                break
+            frame = frame.f_back
+
     def get_frame(self):
         """Return the frame of current execution."""
         return self.current_frame
@@ -192,7 +403,9 @@ class NdbThread:
         its value. The expression cannot contains assignments.
         """
         try:
-            result = eval(expr, self.current_frame.f_globals,
+            # Leading spaces and tabs are allowed, just like eval does.
+            c_code = code_cache.compile(expr.lstrip(' \t'), 'eval')
+            result = eval(c_code, self.current_frame.f_globals,
                           self.current_frame.f_locals)
         except SyntaxError as serr:
             result = serr
@@ -207,7 +420,7 @@ class NdbThread:
         """
         try:
             # Compile and execute code
-            c_code = compile(source=expr, filename="<string>", mode='exec')
+            c_code = code_cache.compile(expr, 'exec')
             exec c_code in self.current_frame.f_globals, self.current_frame.f_locals
             result = ""
         except SyntaxError as serr:
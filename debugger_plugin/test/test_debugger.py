@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" """
+import logging
+import sys
+import unittest
+
+from PyQt4.QtGui import QApplication
+
+import ninja_ide.core.settings
+
+import debugger_plugin.Debugger
+import debugger_plugin.core.models
+import debugger_plugin.core.symbols
+import debugger_plugin.gui.watches
+
+APP = QApplication.instance() or QApplication(sys.argv)
+
+
+class _Adapter(object):
+    """Debugger adapter that records the calls made."""
+
+    def __init__(self):
+        self.calls = []
+
+    def evaluate(self, thread_id, expression, depth=0):
+        self.calls.append(expression)
+        return {'type': 'int', 'value': '1'}
+
+    def evaluate_many(self, thread_id, expressions, depth=0):
+        self.calls.append(expressions)
+        return [{'type': 'int', 'value': '1'} for e in expressions]
+
+    def is_alive(self):
+        self.calls.append('is_alive')
+        return True
+
+    def set_breakpoints(self, filename, lines):
+        self.calls.append((filename, lines))
+        return True
+
+
+class _Plugin(object):
+    """Holds the attributes that the tested methods of the plugin use."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.debugger_adapter = _Adapter()
+        self.sym_finder = debugger_plugin.core.symbols.SymbolCache()
+        self._breakpoints = {}
+        self.watchesWidget = debugger_plugin.gui.watches.WatchesWidget()
+        self.watchesWidget.itemChanged.connect(self.reevaluate_watch)
+
+    def get_active_thread(self):
+        return 1
+
+    def reevaluate_watch(self, watch):
+        plugin = debugger_plugin.Debugger.DebugPlugin
+        plugin.reevaluate_watch.im_func(self, watch)
+
+    def _editor_breakpoints(self):
+        plugin = debugger_plugin.Debugger.DebugPlugin
+        return plugin._editor_breakpoints.im_func(self)
+
+
+class TestWatches(unittest.TestCase):
+
+    def test_reevaluate_watches(self):
+        plugin = _Plugin()
+        model = plugin.watchesWidget.get_model()
+        for expr in ('a', 'b', 'c'):
+            model.append(debugger_plugin.core.models.WatchModel(expr, '', ''))
+
+        debugger = debugger_plugin.Debugger.DebugPlugin
+        debugger.reevaluate_watches.im_func(plugin)
+
+        self.assertEquals(plugin.debugger_adapter.calls, [['a', 'b', 'c']])
+        self.assertEquals([w.value for w in model], ['1', '1', '1'])
+
+
+class TestBreakpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.breakpoints = ninja_ide.core.settings.BREAKPOINTS
+        ninja_ide.core.settings.BREAKPOINTS = {'a.py': [0, 4], 'b.py': [1]}
+
+    def tearDown(self):
+        ninja_ide.core.settings.BREAKPOINTS = self.breakpoints
+
+    def test_update_breakpoints(self):
+        plugin = _Plugin()
+        plugin._breakpoints = {'a.py': [1, 5]}
+        update = debugger_plugin.Debugger.DebugPlugin.update_breakpoints
+        update.im_func(plugin)
+        self.assertEquals(plugin.debugger_adapter.calls,
+                          ['is_alive', ('b.py', [2])])
+        # Without changes, the debugger is not called at all
+        plugin.debugger_adapter.calls = []
+        update.im_func(plugin)
+        self.assertEquals(plugin.debugger_adapter.calls, [])